@@ -6,32 +6,148 @@ Architecture:
 - Upstash Redis: Shared cache across all workers
 - Supabase: Prompt management and analytics
 - Unified generation: Single code path for all generation types
+
+Run with gevent workers so the I/O-bound Gemini/Redis/Supabase calls
+don't pin a worker each:
+    gunicorn -c gunicorn_conf.py app:app
+
+gunicorn_conf.py sets the worker class, counts, keepalive and preload
+(--preload initializes the Gemini client and everything else at module
+level once in the master so forked workers share it copy-on-write).
+
+Sync Flask + gevent is deliberate: monkey-patched greenlets already
+multiplex hundreds of in-flight Gemini/Redis/Supabase calls per worker,
+which is the concurrency an ASGI port (FastAPI/Quart + httpx) would buy
+at the cost of rewriting every route and both REST clients.
 """
 
+# Monkey-patching must run before anything else imports socket/ssl so
+# blocking network calls yield the greenlet instead of the whole worker
+try:
+    from gevent import monkey
+    monkey.patch_all()
+except ImportError:
+    pass
+
+import logging
+import logging.handlers
 import os
-import base64
+import io
 import json
-import hashlib
+import sys
+import queue
+import random
+import threading
 import time
-from functools import lru_cache
-from flask import Flask, request, jsonify
+import uuid
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from functools import lru_cache, wraps
+import blake3
+import httpx
+import pybase64
+import imagehash
+import orjson
+from PIL import Image
+from flask import Flask, request, jsonify, Response, stream_with_context
+from flask.json.provider import JSONProvider
+from werkzeug.exceptions import HTTPException, RequestEntityTooLarge, UnsupportedMediaType
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from google import genai
 from google.genai import types
 
+# print() under gunicorn serializes on a per-line stdout lock and
+# formats eagerly; logging defers %s formatting until the record is
+# actually emitted. Emission itself goes through a QueueHandler so the
+# synchronous stderr write happens on a listener thread, not on the
+# request path - during an upstream incident the error-logging burst
+# would otherwise serialize the very requests that are failing.
+_log_record_queue = queue.SimpleQueue()
+_stderr_handler = logging.StreamHandler(sys.stderr)
+_stderr_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s %(message)s'))
+
+
+def start_log_listener():
+    """(Re)start the listener that drains queued log records to stderr.
+
+    Called at import for direct runs and again from gunicorn's
+    post_fork hook: with preload_app the import-time listener thread
+    lives only in the master and doesn't survive the fork, so without
+    the restart worker logging would queue forever and never emit.
+    """
+    logging.handlers.QueueListener(_log_record_queue, _stderr_handler).start()
+
+
+start_log_listener()
+_queue_handler = logging.handlers.QueueHandler(_log_record_queue)
+# Plain formatter here: prepare() pre-formats in the producer, and the
+# listener's handler applies the real layout
+_queue_handler.setFormatter(logging.Formatter('%(message)s'))
+logging.basicConfig(level=logging.INFO, handlers=[_queue_handler])
+logger = logging.getLogger(__name__)
+
+class OrjsonProvider(JSONProvider):
+    """Route Flask's jsonify through orjson's SIMD encoder."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+# Upload limits: reject junk before paying a Gemini round-trip for it
+MAX_UPLOAD_BYTES = 25_000_000
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
+# Perimeter cap for the whole multipart body (several files per request)
+app.config['MAX_CONTENT_LENGTH'] = 8 * MAX_UPLOAD_BYTES
 
 # =============================================
 # CONFIGURATION
 # =============================================
 
+# Flash for short JSON extraction, Pro only where long-form writing
+# quality is worth Pro-tier latency and cost
 ANALYSIS_MODEL = 'gemini-2.5-flash'
+CAPTION_MODEL = 'gemini-2.5-pro'
 IMAGE_GEN_MODEL = 'gemini-3-pro-image-preview'
+# Verification is a pass/fail comparison inside the generation retry
+# loop, so its latency is paid up to MAX_GENERATION_ATTEMPTS times per
+# request; the lite tier answers it with noticeably lower TTFT
+VERIFY_MODEL = os.environ.get('VERIFY_MODEL', 'gemini-2.5-flash-lite')
 
 # Reliability settings
 MAX_GENERATION_ATTEMPTS = 3
 MAX_VERIFICATION_RETRIES = 2
 CACHE_TTL_SECONDS = 86400 * 7  # 7 days
+RESULT_CACHE_TTL_SECONDS = 86400  # full generation results: 1 day
+
+# HTTP timeouts: (connect, read) - fail fast on connect, allow slower reads
+HTTP_TIMEOUT = (2, 5)
+
+IMAGE_MAGIC_PREFIXES = (
+    b'\xff\xd8\xff',        # JPEG
+    b'\x89PNG\r\n\x1a\n',   # PNG
+    b'RIFF',                # WebP
+    b'GIF8',                # GIF
+)
+
+
+def make_http_session():
+    """Create a pooled HTTP session so TCP+TLS handshakes are amortized
+    across requests instead of paid on every Upstash/Supabase call."""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=10,
+        pool_maxsize=50,
+        max_retries=Retry(total=2, backoff_factor=0.1, status_forcelist=[502, 503, 504])
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
 
 # Environment variables
 GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY")
@@ -40,8 +156,75 @@ UPSTASH_REDIS_REST_TOKEN = os.environ.get("UPSTASH_REDIS_REST_TOKEN")
 SUPABASE_URL = os.environ.get("SUPABASE_URL")
 SUPABASE_ANON_KEY = os.environ.get("SUPABASE_ANON_KEY")
 
-# Initialize Gemini client
-gemini_client = genai.Client(api_key=GOOGLE_API_KEY)
+# Initialize Gemini client on one HTTP/2 keep-alive pool: a single
+# multiplexed TLS connection carries all in-flight Gemini calls instead
+# of re-acquiring a connection per request under load
+gemini_client = genai.Client(
+    api_key=GOOGLE_API_KEY,
+    http_options=types.HttpOptions(
+        client_args={
+            "http2": True,
+            "limits": httpx.Limits(max_keepalive_connections=64, max_connections=128)
+        }
+    )
+)
+
+# Cap concurrent Gemini calls below the per-project rate limit so a
+# burst queues in-process instead of triggering a 429 retry storm
+# upstream. Under gevent the semaphore is greenlet-aware via
+# monkey-patching.
+GEMINI_MAX_CONCURRENCY = 32
+_gemini_sem = threading.BoundedSemaphore(GEMINI_MAX_CONCURRENCY)
+
+
+def gemini_generate(**kwargs):
+    """gemini_client.models.generate_content bounded by the semaphore."""
+    with _gemini_sem:
+        return gemini_client.models.generate_content(**kwargs)
+
+
+def warm_connections():
+    """Pre-open upstream TLS connections after worker fork.
+
+    Pooled connections don't survive forking, so without this the first
+    real requests per worker pay the Gemini and Redis handshakes
+    (~50-150ms each). Called from gunicorn's post_fork hook; runs on
+    io_pool so worker boot isn't delayed.
+    """
+    def ping():
+        try:
+            for _ in gemini_client.models.list(config={"page_size": 1}):
+                break
+        except Exception as e:
+            logger.info("[INIT] Gemini warmup skipped: %s", e)
+        if redis_cache:
+            redis_cache.get("warmup")
+    io_pool.submit(ping)
+
+
+# Shared pool for overlapping independent network I/O (cache lookups,
+# prompt fetches) so they don't serialize on the request thread
+io_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="aux-io")
+
+# Separate pool for fanning out batch generations - keeps them from
+# starving the aux-io pool they use internally
+batch_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="batch")
+MAX_BATCH_SIZE = 8
+
+# Pool for fire-and-poll generation jobs (async=true requests return a
+# job id immediately instead of holding the connection for the whole
+# Gemini pipeline)
+job_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="jobs")
+JOB_TTL_SECONDS = 3600
+
+# Hedged generations get their own pool so a straggler race never ties
+# up the aux-io or job workers. Sized at two generation slots (primary
+# + hedge) per semaphore permit so one request's hedge never queues
+# behind another request's primary - the Gemini semaphore, not this
+# pool, is the real concurrency cap, and under gevent these workers
+# are greenlets, so the headroom is nearly free
+hedge_pool = ThreadPoolExecutor(max_workers=2 * GEMINI_MAX_CONCURRENCY, thread_name_prefix="hedge")
+GENERATION_HEDGE_DELAY_SECONDS = 20
 
 
 # =============================================
@@ -54,24 +237,27 @@ class RedisCache:
     def __init__(self, url, token):
         self.url = url
         self.token = token
-        self.headers = {"Authorization": f"Bearer {token}"}
-    
+        self.session = make_http_session()
+        self.session.headers.update({
+            "Authorization": f"Bearer {token}",
+            "Connection": "keep-alive"
+        })
+
     def _request(self, command):
         """Execute Redis command via REST API."""
         try:
-            response = requests.post(
+            response = self.session.post(
                 f"{self.url}",
-                headers=self.headers,
                 json=command,
-                timeout=5
+                timeout=HTTP_TIMEOUT
             )
             if response.status_code == 200:
-                return response.json().get("result")
+                return orjson.loads(response.content).get("result")
             return None
         except Exception as e:
-            print(f"[REDIS] Error: {e}")
+            logger.warning("[REDIS] Error: %s", e)
             return None
-    
+
     def get(self, key):
         """Get value from cache."""
         return self._request(["GET", key])
@@ -88,43 +274,91 @@ class RedisCache:
         """Check if key exists."""
         result = self._request(["EXISTS", key])
         return result == 1
+
+    def incr(self, key, ttl=86400):
+        """Increment a counter. Fresh counters expire after ttl so
+        stats windows keep rolling instead of growing forever."""
+        result = self._request(["INCR", key])
+        if result == 1:
+            self._request(["EXPIRE", key, ttl])
+        return result
+
+    def acquire_lock(self, key, ttl=60):
+        """Acquire a short-lived lock via SET NX. Returns True if held."""
+        result = self._request(["SET", key, "1", "NX", "EX", ttl])
+        return result == "OK"
+
+    def mget(self, keys):
+        """Get multiple values in a single round-trip."""
+        if not keys:
+            return []
+        result = self._request(["MGET", *keys])
+        if result is None:
+            return [None] * len(keys)
+        return result
     
     def get_json(self, key):
         """Get and parse JSON value."""
         value = self.get(key)
         if value:
             try:
-                return json.loads(value)
+                return orjson.loads(value)
             except:
                 return None
         return None
-    
+
     def set_json(self, key, data, ttl=CACHE_TTL_SECONDS):
         """Set JSON value."""
-        return self.set(key, json.dumps(data), ttl)
+        return self.set(key, orjson.dumps(data).decode('utf-8'), ttl)
     
     def get_binary(self, key):
-        """Get base64-encoded binary data."""
-        value = self.get(key)
-        if value:
-            try:
-                return base64.b64decode(value)
-            except:
-                return None
-        return None
-    
+        """Get binary data.
+
+        Asks Upstash to base64-encode the value in transit (binary isn't
+        JSON-safe), so only one decode pass happens client-side.
+        """
+        try:
+            response = self.session.post(
+                f"{self.url}",
+                json=["GET", key],
+                headers={"Upstash-Encoding": "base64"},
+                timeout=HTTP_TIMEOUT
+            )
+            if response.status_code == 200:
+                result = response.json().get("result")
+                if result:
+                    return pybase64.b64decode(result, validate=True)
+            return None
+        except Exception as e:
+            logger.warning("[REDIS] Error: %s", e)
+            return None
+
     def set_binary(self, key, data, ttl=CACHE_TTL_SECONDS):
-        """Set binary data as base64."""
-        return self.set(key, base64.b64encode(data).decode('utf-8'), ttl)
+        """Set binary data.
+
+        Uses the path-style endpoint with a raw request body, skipping
+        the ~33% base64 inflation and the Python encode pass on writes.
+        """
+        try:
+            response = self.session.post(
+                f"{self.url}/set/{key}?EX={ttl}",
+                data=data,
+                headers={"Content-Type": "application/octet-stream"},
+                timeout=HTTP_TIMEOUT
+            )
+            return response.status_code == 200
+        except Exception as e:
+            logger.warning("[REDIS] Error: %s", e)
+            return False
 
 
 # Initialize Redis (will be None if not configured)
 redis_cache = None
 if UPSTASH_REDIS_REST_URL and UPSTASH_REDIS_REST_TOKEN:
     redis_cache = RedisCache(UPSTASH_REDIS_REST_URL, UPSTASH_REDIS_REST_TOKEN)
-    print("[INIT] Redis cache connected")
+    logger.info("[INIT] Redis cache connected")
 else:
-    print("[INIT] Redis not configured - caching disabled")
+    logger.info("[INIT] Redis not configured - caching disabled")
 
 
 # =============================================
@@ -136,12 +370,14 @@ class SupabaseClient:
     
     def __init__(self, url, key):
         self.url = url
-        self.headers = {
+        self.session = make_http_session()
+        self.session.headers.update({
             "apikey": key,
             "Authorization": f"Bearer {key}",
-            "Content-Type": "application/json"
-        }
-    
+            "Content-Type": "application/json",
+            "Connection": "keep-alive"
+        })
+
     def select(self, table, columns="*", filters=None):
         """Select from table."""
         try:
@@ -149,22 +385,22 @@ class SupabaseClient:
             if filters:
                 for key, value in filters.items():
                     url += f"&{key}=eq.{value}"
-            response = requests.get(url, headers=self.headers, timeout=5)
+            response = self.session.get(url, timeout=HTTP_TIMEOUT)
             if response.status_code == 200:
-                return response.json()
+                return orjson.loads(response.content)
             return []
         except Exception as e:
-            print(f"[SUPABASE] Select error: {e}")
+            logger.warning("[SUPABASE] Select error: %s", e)
             return []
     
     def insert(self, table, data):
         """Insert into table."""
         try:
             url = f"{self.url}/rest/v1/{table}"
-            response = requests.post(url, headers=self.headers, json=data, timeout=5)
+            response = self.session.post(url, json=data, timeout=HTTP_TIMEOUT)
             return response.status_code in [200, 201]
         except Exception as e:
-            print(f"[SUPABASE] Insert error: {e}")
+            logger.warning("[SUPABASE] Insert error: %s", e)
             return False
 
 
@@ -172,9 +408,9 @@ class SupabaseClient:
 supabase = None
 if SUPABASE_URL and SUPABASE_ANON_KEY:
     supabase = SupabaseClient(SUPABASE_URL, SUPABASE_ANON_KEY)
-    print("[INIT] Supabase connected")
+    logger.info("[INIT] Supabase connected")
 else:
-    print("[INIT] Supabase not configured - using hardcoded prompts")
+    logger.info("[INIT] Supabase not configured - using hardcoded prompts")
 
 
 # =============================================
@@ -217,6 +453,121 @@ IMAGE 1 shows a background/surface material. Create an exact copy preserving:
 Fill entire frame, evenly lit. Accuracy is critical.'''
 }
 
+# Static analysis prompts - built once at import instead of per request
+PROMPT_DETAIL_DEFAULT = "What specific detail, texture, or feature does this show? Describe in 5-10 words. Include any visible text. Write only the label."
+
+PROMPT_BACKGROUND_ANALYSIS = """Analyze this background/surface for product photography.
+
+NAME: Short name, 2-4 words
+DESCRIPTION: Describe materials, colors, textures, patterns (80-120 words). Include any text exactly.
+HAS_BRANDING: Contains text, logos, graphics to preserve? (true/false)
+MATERIAL_SCALE: Physical size of repeating elements
+
+JSON: {"name": "...", "description": "...", "has_branding": bool, "material_scale": "..."}"""
+
+PROMPT_STYLE_ANALYSIS = """Analyze this studio photograph for style characteristics.
+Describe in 30-50 words: lighting quality, color temperature, mood, background treatment.
+JSON: {"style_description": "..."}"""
+
+PROMPT_DAILY_PHOTO = "Look at this WIP photo and suggest 3 prompts for social media. Casual and specific. JSON array of 3 strings."
+
+PROMPT_STUDIO_ONE_SHOT = """First, describe this product in 30-50 words: what it is, materials, standout details.
+Then regenerate it as a professional studio product photograph: clean seamless background, soft commercial lighting, product unchanged.
+Return the description as TEXT and the photograph as an IMAGE."""
+
+PROMPT_ANALYZE_QUESTION = """Look at this finished-project photo.
+DESCRIPTION: What the piece is, materials and standout details (30-50 words).
+QUESTIONS: 3 interview questions to draw out the story behind it. Casual and specific.
+JSON: {"description": "...", "questions": ["...", "...", "..."]}"""
+
+PROMPT_BUNDLE_ANALYSIS = """These images are one product intake: the first is the product photo, any images labeled DETAIL show close-ups, and an image labeled BACKGROUND (if present) is the shooting surface.
+
+PRODUCT: orientation, camera_angle, product_dimensions, visible_text.
+DETAILS: for each detail image in order, a 5-10 word label of what it shows, including any visible text.
+BACKGROUND: only if provided - name (2-4 words), description (80-120 words, include any text exactly), has_branding, material_scale.
+
+JSON: {"product": {...}, "details": ["...", ...], "background": {...}}"""
+
+PROMPT_COMBINED_ANALYSIS = """Image 1 is a product photo. Analyze it three ways in one JSON object.
+
+PRODUCT: orientation, camera_angle, product_dimensions, visible_text (as in a metadata analysis).
+STYLE: style_description - lighting quality, color temperature, mood, background treatment in 30-50 words.
+BACKGROUND: only if a second image is provided - name (2-4 words), description (80-120 words, include any text exactly), has_branding, material_scale.
+
+JSON: {"product": {...}, "style": {...}, "background": {...}}"""
+
+# Response schemas: schema-constrained decoding guarantees strict JSON
+# (no Markdown fences) from the analysis model
+SCHEMA_IMAGE_METADATA = {
+    "type": "OBJECT",
+    "properties": {
+        "orientation": {"type": "STRING"},
+        "camera_angle": {"type": "STRING"},
+        "product_dimensions": {"type": "STRING"},
+        "visible_text": {"type": "STRING"}
+    },
+    "required": ["orientation"]
+}
+
+SCHEMA_BACKGROUND_ANALYSIS = {
+    "type": "OBJECT",
+    "properties": {
+        "name": {"type": "STRING"},
+        "description": {"type": "STRING"},
+        "has_branding": {"type": "BOOLEAN"},
+        "material_scale": {"type": "STRING"}
+    },
+    "required": ["name", "description"]
+}
+
+SCHEMA_STYLE_ANALYSIS = {
+    "type": "OBJECT",
+    "properties": {
+        "style_description": {"type": "STRING"}
+    },
+    "required": ["style_description"]
+}
+
+SCHEMA_ANALYZE_QUESTION = {
+    "type": "OBJECT",
+    "properties": {
+        "description": {"type": "STRING"},
+        "questions": {"type": "ARRAY", "items": {"type": "STRING"}}
+    },
+    "required": ["description", "questions"]
+}
+
+SCHEMA_BUNDLE_ANALYSIS = {
+    "type": "OBJECT",
+    "properties": {
+        "product": SCHEMA_IMAGE_METADATA,
+        "details": {"type": "ARRAY", "items": {"type": "STRING"}},
+        "background": SCHEMA_BACKGROUND_ANALYSIS
+    },
+    "required": ["product"]
+}
+
+SCHEMA_COMBINED_ANALYSIS = {
+    "type": "OBJECT",
+    "properties": {
+        "product": SCHEMA_IMAGE_METADATA,
+        "style": SCHEMA_STYLE_ANALYSIS,
+        "background": SCHEMA_BACKGROUND_ANALYSIS
+    },
+    "required": ["product", "style"]
+}
+
+# Call configs are immutable, but pydantic validation on construction
+# isn't free - build each variant once at import and share it
+CFG_JSON = types.GenerateContentConfig(response_mime_type="application/json")
+CFG_IMAGE_METADATA = types.GenerateContentConfig(response_mime_type="application/json", response_schema=SCHEMA_IMAGE_METADATA)
+CFG_BACKGROUND_ANALYSIS = types.GenerateContentConfig(response_mime_type="application/json", response_schema=SCHEMA_BACKGROUND_ANALYSIS)
+CFG_STYLE_ANALYSIS = types.GenerateContentConfig(response_mime_type="application/json", response_schema=SCHEMA_STYLE_ANALYSIS)
+CFG_COMBINED_ANALYSIS = types.GenerateContentConfig(response_mime_type="application/json", response_schema=SCHEMA_COMBINED_ANALYSIS)
+CFG_ANALYZE_QUESTION = types.GenerateContentConfig(response_mime_type="application/json", response_schema=SCHEMA_ANALYZE_QUESTION)
+CFG_BUNDLE_ANALYSIS = types.GenerateContentConfig(response_mime_type="application/json", response_schema=SCHEMA_BUNDLE_ANALYSIS)
+CFG_IMAGE_GEN = types.GenerateContentConfig(response_modalities=["TEXT", "IMAGE"])
+
 FALLBACK_LIGHTING = {
     'softbox': 'LIGHTING: Soft box. Large diffused source at 45° left and above, subtle fill from right. Shadows soft gradients at 30-40% gray with smooth falloff. Highlights broad and wrapped. Exposure balanced and neutral. Background evenly lit matching product. Color temperature neutral daylight (5500K).'
 }
@@ -228,48 +579,155 @@ FALLBACK_BACKGROUNDS = {
 }
 
 
-@lru_cache(maxsize=50)
+# Shared prompt cache settings: Redis layer means only one worker ever
+# pays the Supabase round-trip; the sentinel stops re-querying names
+# that aren't in the database
+PROMPT_CACHE_TTL = 3600  # 1 hour
+PROMPT_MISS_SENTINEL = "__MISS__"
+
+
+def _cached_db_lookup(cache_key, fetch):
+    """Read-through Redis cache with negative caching.
+
+    Returns the cached/fetched value, or None when the database has no
+    entry (cached as a sentinel so misses don't re-query Supabase).
+    """
+    if redis_cache:
+        cached = redis_cache.get(cache_key)
+        if cached is not None:
+            return None if cached == PROMPT_MISS_SENTINEL else cached
+
+    value = fetch()
+
+    if redis_cache:
+        redis_cache.set(cache_key, value if value else PROMPT_MISS_SENTINEL, PROMPT_CACHE_TTL)
+
+    return value
+
+
+# Prompts pre-loaded from Redis in bulk (see prefetch_prompts)
+_prefetched_prompts = {}
+
+
+def prefetch_prompts(names):
+    """Warm the prompt cache with one batched Redis round-trip.
+
+    Fetches all "prompt:<name>" keys via a single MGET instead of one
+    Upstash call per prompt. Misses simply fall through to get_prompt's
+    normal Supabase/fallback path.
+    """
+    if not redis_cache:
+        return
+    values = redis_cache.mget([f"prompt:{name}" for name in names])
+    for name, value in zip(names, values):
+        if value and value != PROMPT_MISS_SENTINEL:
+            _prefetched_prompts[name] = value
+
+
+@lru_cache(maxsize=200)
 def get_prompt(name):
-    """Get prompt by name from Supabase or fallback."""
-    if supabase:
-        results = supabase.select('prompts', 'content', {'name': name, 'is_active': 'true'})
-        if results and len(results) > 0:
-            return results[0].get('content', '')
+    """Get prompt by name from Redis/Supabase or fallback."""
+    if name in _prefetched_prompts:
+        return _prefetched_prompts[name]
+
+    def fetch():
+        if supabase:
+            results = supabase.select('prompts', 'content', {'name': name, 'is_active': 'true'})
+            if results and len(results) > 0:
+                return results[0].get('content', '')
+        return None
+
+    value = _cached_db_lookup(f"prompt:{name}", fetch)
+    if value:
+        return value
     return FALLBACK_PROMPTS.get(name, '')
 
 
-@lru_cache(maxsize=20)
+@lru_cache(maxsize=200)
 def get_lighting_scheme(scheme_id):
-    """Get lighting scheme from Supabase or fallback."""
-    print(f"[LIGHTING] Looking up scheme: {scheme_id}")
-    if supabase:
-        # Query by ID only (is_active filter handled differently for booleans)
-        results = supabase.select('lighting_schemes', 'id,prompt_text,is_active', {'id': scheme_id})
-        if results and len(results) > 0:
-            scheme = results[0]
-            if scheme.get('is_active', True):
-                print(f"[LIGHTING] Found in Supabase: {scheme_id}")
-                return scheme.get('prompt_text', '')
-    
+    """Get lighting scheme from Redis/Supabase or fallback."""
+    logger.info("[LIGHTING] Looking up scheme: %s", scheme_id)
+
+    def fetch():
+        if supabase:
+            # Query by ID only (is_active filter handled differently for booleans)
+            results = supabase.select('lighting_schemes', 'id,prompt_text,is_active', {'id': scheme_id})
+            if results and len(results) > 0:
+                scheme = results[0]
+                if scheme.get('is_active', True):
+                    logger.info("[LIGHTING] Found in Supabase: %s", scheme_id)
+                    return scheme.get('prompt_text', '')
+        return None
+
+    value = _cached_db_lookup(f"lighting:{scheme_id}", fetch)
+    if value:
+        return value
+
     fallback = FALLBACK_LIGHTING.get(scheme_id, FALLBACK_LIGHTING['softbox'])
-    print(f"[LIGHTING] Using fallback for: {scheme_id}")
+    logger.info("[LIGHTING] Using fallback for: %s", scheme_id)
     return fallback
 
 
-@lru_cache(maxsize=10)
+@lru_cache(maxsize=200)
 def get_background_description(bg_id):
     """Get default background description."""
-    if supabase:
-        results = supabase.select('backgrounds', 'description', {'id': bg_id})
-        if results and len(results) > 0:
-            return results[0].get('description', '')
+
+    def fetch():
+        if supabase:
+            results = supabase.select('backgrounds', 'description', {'id': bg_id})
+            if results and len(results) > 0:
+                return results[0].get('description', '')
+        return None
+
+    value = _cached_db_lookup(f"background:{bg_id}", fetch)
+    if value:
+        return value
     return FALLBACK_BACKGROUNDS.get(bg_id, FALLBACK_BACKGROUNDS['white'])
 
 
+# Analytics logging is pure overhead on the response path, so rows go
+# through a bounded queue drained by a background thread that batches
+# them into single Supabase inserts (the REST API accepts arrays)
+LOG_BATCH_SIZE = 50
+
+_log_queue = queue.Queue(maxsize=10000)
+
+
+def _drain_logs():
+    while True:
+        batch = [_log_queue.get()]
+        try:
+            while len(batch) < LOG_BATCH_SIZE:
+                batch.append(_log_queue.get_nowait())
+        except queue.Empty:
+            pass
+        if supabase:
+            supabase.insert('generation_logs', batch)
+
+
+def start_log_drain():
+    """(Re)start the analytics drain thread.
+
+    Called at import for plain `python app.py` runs and again from
+    gunicorn's post_fork hook: with preload_app the import-time thread
+    lives only in the master and doesn't survive the fork, so without
+    the restart every worker's queue would fill and drop all rows.
+    """
+    threading.Thread(target=_drain_logs, daemon=True, name="log-drain").start()
+
+
+start_log_drain()
+
+
 def log_generation(data):
-    """Log generation to Supabase for analytics."""
-    if supabase:
-        supabase.insert('generation_logs', data)
+    """Queue a generation log for the background drain thread."""
+    if not supabase:
+        return
+    try:
+        _log_queue.put_nowait(data)
+    except queue.Full:
+        # Better to drop analytics than block a response
+        pass
 
 
 # =============================================
@@ -281,19 +739,323 @@ def clean_json_text(text):
     if not text:
         return "{}"
     text = text.strip()
-    if text.startswith("```json"):
-        text = text[7:]
-    if text.startswith("```"):
-        text = text[3:]
-    if text.endswith("```"):
-        text = text[:-3]
+    # removeprefix/removesuffix are C-implemented and copy nothing when
+    # the fence is absent
+    text = text.removeprefix("```json").removeprefix("```").removesuffix("```")
     return text.strip()
 
 
 def generate_cache_key(data_bytes, prefix=""):
-    """Generate a cache key from data."""
-    hash_obj = hashlib.md5(data_bytes)
-    return f"{prefix}{hash_obj.hexdigest()}"
+    """Generate a cache key from data.
+
+    BLAKE3 is SIMD-vectorized and runs ~10x faster than MD5 on the
+    multi-MB image buffers we hash; cache keys don't need cryptographic
+    strength, just collision resistance.
+
+    If a key ever becomes security-adjacent (e.g. signed Supabase
+    Storage URLs), switch that call site to hashlib.sha256 - OpenSSL
+    dispatches it to the SHA-NI/ARMv8-SHA2 instructions, so the
+    cryptographic upgrade costs little over this truncated digest.
+    """
+    hash_obj = blake3.blake3(data_bytes)
+    return f"{prefix}{hash_obj.hexdigest(length=16)}"
+
+
+ANALYSIS_CACHE_TTL_SECONDS = 86400  # analysis results: 1 day
+
+# Per-IP rate limiting: a browser retrying a flaky upload can fan into
+# dozens of paid image generations, and upstream 429s compound through
+# the SDK's retries. Counters live in Redis (fixed one-minute windows,
+# shared across workers) with a worker-local fallback when Redis is
+# down.
+_local_rate_lock = threading.Lock()
+_local_rate_counts = {}
+
+
+def _local_rate_incr(key):
+    with _local_rate_lock:
+        if len(_local_rate_counts) > 10000:
+            _local_rate_counts.clear()
+        _local_rate_counts[key] = _local_rate_counts.get(key, 0) + 1
+        return _local_rate_counts[key]
+
+
+def client_ip():
+    # Rightmost X-Forwarded-For entry: appended by our own proxy, so
+    # it's the one hop a caller can't spoof. The leftmost entries are
+    # client-supplied - keying on them would hand every request a
+    # fresh rate-limit bucket for the price of a random header.
+    forwarded = request.headers.get('X-Forwarded-For')
+    if forwarded:
+        return forwarded.split(',')[-1].strip()
+    return request.remote_addr or 'unknown'
+
+
+def rate_limit(per_minute):
+    """Cap an endpoint at per_minute requests per client IP."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = f"rl:{fn.__name__}:{client_ip()}:{int(time.time() // 60)}"
+            if redis_cache:
+                count = redis_cache.incr(key, ttl=120)
+            else:
+                count = _local_rate_incr(key)
+            if count and count > per_minute:
+                return jsonify({"error": "Rate limit exceeded, retry shortly"}), 429, {"Retry-After": "60"}
+            return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# In-flight work by key: concurrent identical requests wait on the
+# leader's future instead of each paying their own Gemini call
+_inflight_lock = threading.Lock()
+_inflight = {}
+
+
+def single_flight(key, fn):
+    """Coalesce concurrent identical work under one leader.
+
+    The first caller for a key runs fn; everyone else arriving before
+    it finishes blocks on the same future and shares the result.
+    """
+    with _inflight_lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = Future()
+            _inflight[key] = future
+
+    if not leader:
+        return future.result()
+
+    try:
+        result = fn()
+        future.set_result(result)
+        return result
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+
+# In-process L1 in front of the Redis analysis cache: repeat hits in
+# the same worker skip even the Redis round-trip. Bounded and
+# time-limited so a long-lived worker can't accumulate stale results.
+L1_CACHE_MAX_ENTRIES = 1024
+L1_CACHE_TTL_SECONDS = 1800
+
+_l1_lock = threading.Lock()
+_l1_cache = {}
+
+
+def _l1_get(key):
+    with _l1_lock:
+        entry = _l1_cache.get(key)
+        if entry is None:
+            return None
+        result, expires = entry
+        if time.time() > expires:
+            del _l1_cache[key]
+            return None
+        return result
+
+
+def _l1_put(key, result):
+    with _l1_lock:
+        if len(_l1_cache) >= L1_CACHE_MAX_ENTRIES:
+            # Evict the oldest quarter; insertion order approximates age
+            for stale in list(_l1_cache)[:L1_CACHE_MAX_ENTRIES // 4]:
+                del _l1_cache[stale]
+        _l1_cache[key] = (result, time.time() + L1_CACHE_TTL_SECONDS)
+
+
+def cached_analysis(prefix, image_bytes, prompt, compute):
+    """Content-hash cache around an analysis call.
+
+    Identical (image, prompt) pairs are common in iterative client
+    flows; an in-process dict lookup (L1) or Redis GET (L2) replaces
+    the multi-second Gemini round-trip. compute() runs on miss and its
+    JSON-able result is cached for 24h. Concurrent duplicates coalesce
+    onto one in-flight call.
+    """
+    hasher = blake3.blake3(image_bytes)
+    hasher.update(prompt.encode('utf-8'))
+    key = f"{prefix}{hasher.hexdigest(length=16)}"
+    return _cached_result(key, compute, ANALYSIS_CACHE_TTL_SECONDS)
+
+
+CAPTION_CACHE_TTL_SECONDS = 3600
+
+
+def cached_text_generation(prefix, fields, compute):
+    """Cache for text-only generations keyed on canonicalized inputs.
+
+    Interview transcripts are rarely byte-identical across retries -
+    re-typed answers differ in case and spacing - so each field is
+    casefolded and whitespace-collapsed before hashing. Coarser than a
+    true semantic match, but catches the common near-duplicates without
+    an embedding round-trip, and wrong-hit risk is nil since any real
+    wording change produces a new key.
+    """
+    hasher = blake3.blake3()
+    for field in fields:
+        hasher.update(" ".join(field.casefold().split()).encode('utf-8'))
+        hasher.update(b"\x00")
+    key = f"{prefix}{hasher.hexdigest(length=16)}"
+    return _cached_result(key, compute, CAPTION_CACHE_TTL_SECONDS)
+
+
+def _count_cache(event):
+    """Fire-and-forget hit/miss counter (rolling daily window via the
+    incr TTL), surfaced by /cache/stats. Off the request thread so the
+    hot path never waits on it."""
+    if redis_cache:
+        io_pool.submit(redis_cache.incr, f"stats:cache:{event}")
+
+
+def _cached_result(key, compute, ttl):
+    local = _l1_get(key)
+    if local is not None:
+        _count_cache("hits")
+        return local
+
+    if redis_cache:
+        cached = redis_cache.get_json(key)
+        if cached is not None:
+            logger.info("[CACHE] Analysis hit: %s", key)
+            _l1_put(key, cached)
+            _count_cache("hits")
+            return cached
+
+    def fill():
+        _count_cache("misses")
+        result = compute()
+        if result is not None:
+            _l1_put(key, result)
+            if redis_cache:
+                redis_cache.set_json(key, result, ttl)
+        return result
+
+    return single_flight(key, fill)
+
+
+def stream_ndjson(contents, config, model=ANALYSIS_MODEL):
+    """Yield Gemini text fragments as NDJSON lines as they arrive.
+
+    Time-to-first-byte drops from full generation time to the first
+    model chunk; clients can render progress from real tokens.
+
+    Holds the Gemini semaphore for the stream's lifetime so stream=true
+    requests count against GEMINI_MAX_CONCURRENCY like everything else.
+    """
+    with _gemini_sem:
+        stream = gemini_client.models.generate_content_stream(
+            model=model,
+            contents=contents,
+            config=config
+        )
+        for chunk in stream:
+            if chunk.text:
+                yield orjson.dumps({"text": chunk.text}) + b"\n"
+
+
+ANALYSIS_MAX_DIMENSION = 1024
+# Generation inputs keep a looser cap: fine label text on the product
+# has to survive for the model to reproduce it faithfully
+GENERATION_MAX_DIMENSION = 1536
+
+
+def shrink_image(image_bytes, max_dim=ANALYSIS_MAX_DIMENSION):
+    """Downscale an image for analysis-only calls.
+
+    Short-label analyses don't benefit from megapixels, and halving the
+    pixel count roughly halves Gemini latency plus upstream bandwidth.
+    Returns (bytes, mime); mime is None when the original is kept.
+    """
+    try:
+        img = Image.open(io.BytesIO(image_bytes))
+        if max(img.size) <= max_dim:
+            return image_bytes, None
+        img.thumbnail((max_dim, max_dim), Image.Resampling.LANCZOS)
+        if img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        out = io.BytesIO()
+        img.save(out, format='WEBP', quality=85, method=4)
+        return out.getvalue(), 'image/webp'
+    except Exception as e:
+        logger.warning("[SHRINK] Failed, using original: %s", e)
+        return image_bytes, None
+
+
+def looks_like_image(head):
+    """Cheap magic-byte sniff for the formats clients actually send."""
+    if any(head.startswith(prefix) for prefix in IMAGE_MAGIC_PREFIXES):
+        return True
+    # HEIC/HEIF and other ISO-BMFF containers: 'ftyp' at offset 4
+    return len(head) >= 8 and head[4:8] == b'ftyp'
+
+
+def read_upload(file_storage):
+    """Read an uploaded file through a bounded 64KB chunk buffer.
+
+    Avoids handing werkzeug's stream one unbounded read() for multi-MB
+    photos, rejects non-image bytes from the first chunk's magic
+    numbers, and bails before buffering anything past the size cap -
+    all cheaper than letting Gemini reject the upload seconds later.
+    """
+    buf = io.BytesIO()
+    total = 0
+    chunk = file_storage.stream.read(65536)
+
+    if chunk and not looks_like_image(chunk):
+        raise UnsupportedMediaType("Upload is not a recognized image format")
+
+    while chunk:
+        total += len(chunk)
+        if total > MAX_UPLOAD_BYTES:
+            raise RequestEntityTooLarge(f"Upload exceeds {MAX_UPLOAD_BYTES} bytes")
+        buf.write(chunk)
+        chunk = file_storage.stream.read(65536)
+
+    return buf.getvalue()
+
+
+@lru_cache(maxsize=32)
+def text_part(text):
+    """Memoized types.Part for recurring static prompt strings, so the
+    SDK conversion isn't redone on every call."""
+    return types.Part(text=text)
+
+
+def read_and_hash(file_storage):
+    """Read an uploaded file in chunks while hashing it.
+
+    Same magic-number check and size cap as read_upload, with a blake3
+    hasher folded into the loop - one pass over the buffer and the
+    cache key is ready the moment parsing completes, instead of
+    re-walking a multi-MB bytes object in generate_cache_key.
+    """
+    hasher = blake3.blake3()
+    buf = io.BytesIO()
+    total = 0
+    chunk = file_storage.stream.read(65536)
+
+    if chunk and not looks_like_image(chunk):
+        raise UnsupportedMediaType("Upload is not a recognized image format")
+
+    while chunk:
+        total += len(chunk)
+        if total > MAX_UPLOAD_BYTES:
+            raise RequestEntityTooLarge(f"Upload exceeds {MAX_UPLOAD_BYTES} bytes")
+        hasher.update(chunk)
+        buf.write(chunk)
+        chunk = file_storage.stream.read(65536)
+
+    return buf.getvalue(), hasher.hexdigest(length=16)
 
 
 def get_composition_prompt(orientation):
@@ -318,8 +1080,10 @@ class GenerationRequest:
         self.main_mime = None
         self.background_image = None
         self.background_mime = None
+        self.background_hash = None
         self.cached_background = None
         self.master_image = None
+        self.master_mime = 'image/jpeg'
         self.detail_images = []
         self.detail_labels = []
         
@@ -335,35 +1099,66 @@ class GenerationRequest:
         self.visible_text = request_obj.form.get('visibleText', '')
         self.master_style = request_obj.form.get('masterStyle', '')
         self.has_branding = request_obj.form.get('hasBranding', 'false').lower() == 'true'
+        # 'binary' skips the base64-in-JSON envelope: raw PNG bytes are
+        # ~33% smaller on the wire and avoid two full buffer copies
+        self.binary_response = request_obj.form.get('format', 'json') == 'binary'
+        # async=true detaches the generation into a polled job
+        self.async_job = request_obj.form.get('async', 'false').lower() == 'true'
+        # speculative=1 races two generation attempts from the start
+        # instead of hedging only after the delay
+        self.speculative = request_obj.form.get('speculative', '0') == '1'
         
         # Validate quality
         if self.quality not in ['1K', '2K']:
             self.quality = '1K'
         
-        # Parse images
+        # Parse images. Phone photos arrive at 12 MP while the model
+        # downsamples its inputs anyway, so oversized originals only
+        # cost upload time and input tokens; shrink everything unless
+        # the client opts out with hi_res=true, as on the analysis
+        # routes. The pregenerated background is skipped - it came out
+        # of the model at output resolution already.
+        shrink = request_obj.form.get('hi_res', 'false').lower() != 'true'
+
         if 'image' in request_obj.files:
             f = request_obj.files['image']
-            self.main_image = f.read()
+            self.main_image = read_upload(f)
             self.main_mime = f.content_type
-        
+            if shrink:
+                self.main_image, shrunk_mime = shrink_image(self.main_image, max_dim=GENERATION_MAX_DIMENSION)
+                self.main_mime = shrunk_mime or self.main_mime
+
         if 'backgroundImage' in request_obj.files:
             f = request_obj.files['backgroundImage']
-            self.background_image = f.read()
+            # Hash before shrinking so the background cache key stays
+            # stable across hi_res settings for the same upload
+            self.background_image, self.background_hash = read_and_hash(f)
             self.background_mime = f.content_type
-        
+            if shrink:
+                self.background_image, shrunk_mime = shrink_image(self.background_image)
+                self.background_mime = shrunk_mime or self.background_mime
+
         if 'cachedBackground' in request_obj.files:
             f = request_obj.files['cachedBackground']
-            self.cached_background = f.read()
-        
+            self.cached_background = read_upload(f)
+
         if 'masterImage' in request_obj.files:
             f = request_obj.files['masterImage']
-            self.master_image = f.read()
-        
+            self.master_image = read_upload(f)
+            self.master_mime = f.content_type or self.master_mime
+            if shrink:
+                self.master_image, shrunk_mime = shrink_image(self.master_image)
+                self.master_mime = shrunk_mime or self.master_mime
+
         # Parse detail images
         for i in range(1, 4):
             if f'detail{i}' in request_obj.files:
                 f = request_obj.files[f'detail{i}']
-                self.detail_images.append((f.read(), f.content_type))
+                data, mime = read_upload(f), f.content_type
+                if shrink:
+                    data, shrunk_mime = shrink_image(data)
+                    mime = shrunk_mime or mime
+                self.detail_images.append((data, mime))
                 label = request_obj.form.get(f'detail{i}Label', f'Detail {i}')
                 self.detail_labels.append(label)
         
@@ -382,51 +1177,324 @@ class GenerationRequest:
             self.lighting_prompt = get_lighting_scheme('softbox')
         
         # Debug logging
-        print(f"[REQUEST] orientation={self.orientation}, lighting_scheme={self.lighting_scheme_id}")
-        print(f"[REQUEST] lighting_prompt_length={len(self.lighting_prompt) if self.lighting_prompt else 0}")
+        logger.info("[REQUEST] orientation=%s, lighting_scheme=%s", self.orientation, self.lighting_scheme_id)
+        logger.info("[REQUEST] lighting_prompt_length=%s", len(self.lighting_prompt) if self.lighting_prompt else 0)
+
+
+# Gemini explicit context-cache handles, keyed by the static prompt
+# variant (orientation + lighting + background mode). Values are
+# (name, deadline): handles die with the server-side TTL, so each memo
+# carries a deadline slightly ahead of it and is recreated once past
+_context_caches = {}
+
+# Renew handles this long before the server-side cache expires, so a
+# handle handed out near its deadline still has usable life left
+CONTEXT_CACHE_MARGIN_SECONDS = 60
+# Failed creations back off briefly instead of pinning the inline path
+# (or retrying the API) on every call
+CONTEXT_CACHE_FAILURE_RETRY_SECONDS = 300
+# Per-image analysis entries arrive one per distinct upload, so the
+# memo needs a bound; evict the quarter closest to expiry, like _l1_cache
+CONTEXT_CACHE_MAX_ENTRIES = 512
+
+
+def get_context_cache(cache_key, contents, model=IMAGE_GEN_MODEL, ttl_seconds=3600):
+    """Create or reuse an explicit Gemini context cache for contents
+    that recur across calls, so their tokens aren't re-sent and
+    re-processed every time. Returns the cache name, or None if
+    unavailable.
+    """
+    now = time.time()
+    entry = _context_caches.get(cache_key)
+    if entry and now < entry[1]:
+        return entry[0]
 
+    name = None
+    if redis_cache:
+        name = redis_cache.get(f"ctx_cache:{cache_key}")
 
-def generate_image(content_parts, quality):
-    """Core generation function with retries."""
-    last_error = None
-    
-    for attempt in range(MAX_GENERATION_ATTEMPTS):
+    if not name:
         try:
-            response = gemini_client.models.generate_content(
-                model=IMAGE_GEN_MODEL,
-                contents=content_parts,
-                config=types.GenerateContentConfig(
-                    response_modalities=["TEXT", "IMAGE"]
+            cache = gemini_client.caches.create(
+                model=model,
+                config=types.CreateCachedContentConfig(
+                    contents=contents,
+                    ttl=f"{ttl_seconds}s"
                 )
             )
-            
-            if response.candidates and response.candidates[0].content.parts:
-                for part in response.candidates[0].content.parts:
-                    if part.inline_data:
-                        return part.inline_data.data, None
-            
-            last_error = "No image in response"
-            
+            name = cache.name
+            if redis_cache:
+                # The Redis copy expires ahead of the server cache so
+                # other workers never fetch an already-dead handle
+                redis_cache.set(f"ctx_cache:{cache_key}", name,
+                                max(ttl_seconds - CONTEXT_CACHE_MARGIN_SECONDS, 60))
         except Exception as e:
-            last_error = str(e)
-            print(f"[GEN] Attempt {attempt + 1} failed: {e}")
-    
-    return None, f"Failed after {MAX_GENERATION_ATTEMPTS} attempts: {last_error}"
+            logger.warning("[CTX-CACHE] Unavailable: %s", e)
+            name = None
 
+    if name:
+        deadline = now + ttl_seconds - CONTEXT_CACHE_MARGIN_SECONDS
+    else:
+        deadline = now + CONTEXT_CACHE_FAILURE_RETRY_SECONDS
+    if len(_context_caches) >= CONTEXT_CACHE_MAX_ENTRIES:
+        for stale in sorted(_context_caches, key=lambda k: _context_caches[k][1])[:CONTEXT_CACHE_MAX_ENTRIES // 4]:
+            _context_caches.pop(stale, None)
+    _context_caches[cache_key] = (name, deadline)
+    return name
 
-def verify_generation(original_bytes, generated_bytes, orientation, visible_text=None):
-    """Verify generated image meets criteria."""
-    
-    text_check = ""
-    text_field = ""
-    if visible_text:
-        text_check = f'\n5. TEXT: Visible markings "{visible_text}" preserved correctly?'
-        text_field = '"text_ok": bool, '
-    
-    prompt_template = get_prompt('verification')
-    if not prompt_template:
-        # Fallback verification prompt - no curly braces to avoid format issues
-        prompt_template = '''Compare these images. Image 1 is original product, Image 2 is generated.
+
+def invalidate_context_cache(name):
+    """Forget a handle the server no longer honors.
+
+    Covers the race where the server-side cache was evicted ahead of
+    our deadline; the next caller recreates it.
+    """
+    for key, (cached_name, _) in list(_context_caches.items()):
+        if cached_name == name:
+            _context_caches.pop(key, None)
+            if redis_cache:
+                redis_cache.delete(f"ctx_cache:{key}")
+
+
+def analysis_image_call(image_bytes, mime_type, prompt, config, schema=None):
+    """Analysis call that reuses a server-side context cache for the image.
+
+    The same photo flows through several analysis endpoints back to
+    back; registering its vision tokens once (10min TTL) means
+    follow-up calls send only the prompt. Falls back to inline image
+    parts whenever the cache can't be created or a handle turns out to
+    be dead on the server side.
+    """
+    image_hash = blake3.blake3(image_bytes).hexdigest(length=16)
+    cache_name = get_context_cache(
+        f"img:{image_hash}",
+        [types.Part.from_bytes(data=image_bytes, mime_type=mime_type)],
+        model=ANALYSIS_MODEL,
+        ttl_seconds=600
+    )
+
+    if cache_name:
+        kwargs = {"response_mime_type": "application/json", "cached_content": cache_name}
+        if schema:
+            kwargs["response_schema"] = schema
+        try:
+            return gemini_generate(
+                model=ANALYSIS_MODEL,
+                contents=[prompt],
+                config=types.GenerateContentConfig(**kwargs)
+            )
+        except Exception as e:
+            logger.warning("[CTX-CACHE] Cached-content call failed, retrying inline: %s", e)
+            invalidate_context_cache(cache_name)
+
+    return gemini_generate(
+        model=ANALYSIS_MODEL,
+        contents=[types.Part.from_bytes(data=image_bytes, mime_type=mime_type), prompt],
+        config=config
+    )
+
+
+def generation_fingerprint(gen_req):
+    """Hash everything that determines the generated output.
+
+    Two requests with the same fingerprint would produce equivalent
+    images, so they can share one pipeline run. The model name is
+    included so the keys invalidate themselves on model upgrades.
+    """
+    hasher = blake3.blake3()
+    hasher.update(gen_req.main_image or b"")
+    hasher.update(gen_req.background_image or b"")
+    hasher.update(gen_req.cached_background or b"")
+    hasher.update(gen_req.master_image or b"")
+    for detail_bytes, _ in gen_req.detail_images:
+        hasher.update(detail_bytes)
+    params = "|".join([
+        IMAGE_GEN_MODEL,
+        gen_req.quality,
+        gen_req.lighting_scheme_id or '',
+        gen_req.orientation,
+        gen_req.background_description,
+        gen_req.material_scale,
+        gen_req.product_dimensions,
+        gen_req.visible_text,
+        gen_req.master_style,
+        str(gen_req.has_branding)
+    ])
+    hasher.update(params.encode('utf-8'))
+    return hasher.hexdigest(length=16)
+
+
+def wait_for_duplicate_result(result_key, timeout=60):
+    """Block-poll for a result another worker is currently generating."""
+    delay = 0.5
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        time.sleep(delay)
+        cached = redis_cache.get_binary(result_key)
+        if cached:
+            return cached
+        delay = min(delay * 1.5, 5)
+    return None
+
+
+class BatchItem:
+    """Adapter exposing one batch-manifest entry through the form/files
+    interface GenerationRequest expects."""
+
+    def __init__(self, params, files):
+        self.form = {key: str(value) for key, value in params.items()}
+        self.files = files
+
+
+def generate_image(content_parts, quality, cached_content=None, inline_prefix=None):
+    """Core generation function with retries.
+
+    inline_prefix is the static prompt text the cached_content handle
+    stands in for. If a call with the handle fails - typically because
+    the server-side cache expired ahead of our memo - the handle is
+    dropped and the remaining attempts run with the prefix inlined, so
+    a dead handle costs one attempt instead of the whole request.
+    """
+    last_error = None
+
+    if cached_content:
+        config = types.GenerateContentConfig(response_modalities=["TEXT", "IMAGE"], cached_content=cached_content)
+    else:
+        config = CFG_IMAGE_GEN
+
+    for attempt in range(MAX_GENERATION_ATTEMPTS):
+        try:
+            response = gemini_generate(
+                model=IMAGE_GEN_MODEL,
+                contents=content_parts,
+                config=config
+            )
+
+            if response.candidates and response.candidates[0].content.parts:
+                for part in response.candidates[0].content.parts:
+                    if part.inline_data:
+                        return part.inline_data.data, None
+
+            last_error = "No image in response"
+
+        except Exception as e:
+            last_error = str(e)
+            logger.warning("[GEN] Attempt %s failed: %s", attempt + 1, e)
+            if cached_content and inline_prefix is not None:
+                logger.warning("[CTX-CACHE] Dropping handle %s, retrying inline", cached_content)
+                invalidate_context_cache(cached_content)
+                cached_content = None
+                config = CFG_IMAGE_GEN
+                content_parts = content_parts[:-1] + [inline_prefix + "\n\n" + content_parts[-1]]
+
+    return None, f"Failed after {MAX_GENERATION_ATTEMPTS} attempts: {last_error}"
+
+
+def generate_image_hedged(content_parts, quality, cached_content=None, speculative=False, inline_prefix=None):
+    """generate_image with a tail-latency hedge.
+
+    If the first attempt is still running after the hedge delay, race a
+    second one and take whichever finishes first. p99 falls toward the
+    p50 of two draws; cost only rises on the slow tail, unlike racing
+    every request upfront. With speculative=True (premium flows that
+    opt in via the form flag) the second attempt launches immediately,
+    trading a guaranteed duplicate call for max-draw latency. The
+    losing call can't be cancelled mid-API and just runs out on the
+    hedge pool.
+    """
+    first = hedge_pool.submit(generate_image, content_parts, quality, cached_content, inline_prefix)
+    if not speculative:
+        done, _ = wait([first], timeout=GENERATION_HEDGE_DELAY_SECONDS)
+        if done:
+            return first.result()
+        logger.info("[GEN] Hedging: first attempt exceeded %ss", GENERATION_HEDGE_DELAY_SECONDS)
+    second = hedge_pool.submit(generate_image, content_parts, quality, cached_content, inline_prefix)
+    done, _ = wait([first, second], return_when=FIRST_COMPLETED)
+    return done.pop().result()
+
+
+VERIFY_CACHE_TTL_SECONDS = 86400  # verification verdicts: 1 day
+
+# Verification skip thresholds: once a (scheme, orientation) combo has
+# proven itself, most of its verification calls are pure latency
+VERIFY_SKIP_MIN_SAMPLES = 50
+VERIFY_SKIP_PASS_RATE = 0.95
+VERIFY_SKIP_PROBABILITY = 0.9
+
+
+def record_verification_stats(scheme_id, orientation, passed):
+    """Track per-combination verification outcomes in Redis."""
+    if not redis_cache:
+        return
+    base = f"verify_stats:{scheme_id}:{orientation}"
+    redis_cache.incr(f"{base}:total")
+    if passed:
+        redis_cache.incr(f"{base}:passed")
+
+
+def should_skip_verification(scheme_id, orientation, has_text=False):
+    """Probabilistically skip verification for combinations whose
+    historical pass rate makes the check nearly always redundant.
+
+    Never skips when the product carries visible text - garbled
+    lettering is the failure mode verification exists to catch, and
+    aggregate pass rates say nothing about this particular label.
+    """
+    if has_text:
+        return False
+    if not redis_cache:
+        return False
+    base = f"verify_stats:{scheme_id}:{orientation}"
+    values = redis_cache.mget([f"{base}:passed", f"{base}:total"])
+    try:
+        passed = int(values[0] or 0)
+        total = int(values[1] or 0)
+    except (TypeError, ValueError):
+        return False
+    if total > VERIFY_SKIP_MIN_SAMPLES and passed / total > VERIFY_SKIP_PASS_RATE:
+        return random.random() < VERIFY_SKIP_PROBABILITY
+    return False
+
+
+def verification_cache_key(original_bytes, generated_bytes, orientation):
+    """Semantic cache key for a verification verdict.
+
+    Perceptual hashes quantize image content, so near-duplicate
+    (original, generated) pairs map to the same key and can reuse the
+    verdict without another Gemini Flash call.
+    """
+    try:
+        original_hash = imagehash.phash(Image.open(io.BytesIO(original_bytes)))
+        generated_hash = imagehash.phash(Image.open(io.BytesIO(generated_bytes)))
+        return f"verify:{original_hash}:{generated_hash}:{orientation}"
+    except Exception as e:
+        logger.warning("[VERIFY] pHash failed: %s", e)
+        return None
+
+
+def verify_generation(original_bytes, generated_bytes, orientation, visible_text=None, original_mime="image/jpeg"):
+    """Verify generated image meets criteria."""
+
+    # Semantic cache: near-duplicate image pairs reuse the stored verdict
+    cache_key = None
+    if redis_cache:
+        cache_key = verification_cache_key(original_bytes, generated_bytes, orientation)
+        if cache_key:
+            cached = redis_cache.get_json(cache_key)
+            if cached is not None:
+                logger.info("[VERIFY] Semantic cache hit")
+                return cached.get("pass", False), cached.get("issues", [])
+
+    text_check = ""
+    text_field = ""
+    if visible_text:
+        text_check = f'\n5. TEXT: Visible markings "{visible_text}" preserved correctly?'
+        text_field = '"text_ok": bool, '
+    
+    prompt_template = get_prompt('verification')
+    if not prompt_template:
+        # Fallback verification prompt - no curly braces to avoid format issues
+        prompt_template = '''Compare these images. Image 1 is original product, Image 2 is generated.
 Verify: product fidelity, orientation (ORIENTATION_PLACEHOLDER), composition, lighting unity.
 JSON with pass (boolean) and issues (array of strings).'''
     
@@ -437,57 +1505,114 @@ JSON with pass (boolean) and issues (array of strings).'''
     prompt = prompt.replace("{text_field}", text_field)
     
     try:
-        response = gemini_client.models.generate_content(
-            model=ANALYSIS_MODEL,
+        response = gemini_generate(
+            model=VERIFY_MODEL,
             contents=[
-                types.Part.from_bytes(data=original_bytes, mime_type="image/jpeg"),
+                types.Part.from_bytes(data=original_bytes, mime_type=original_mime),
                 types.Part.from_bytes(data=generated_bytes, mime_type="image/png"),
                 prompt
             ],
-            config=types.GenerateContentConfig(response_mime_type="application/json")
+            config=CFG_JSON
         )
         
-        result = json.loads(clean_json_text(response.text))
-        return result.get("pass", False), result.get("issues", [])
+        result = orjson.loads(clean_json_text(response.text))
+        passed = result.get("pass", False)
+        issues = result.get("issues", [])
+
+        if cache_key:
+            redis_cache.set_json(cache_key, {"pass": passed, "issues": issues}, VERIFY_CACHE_TTL_SECONDS)
+
+        return passed, issues
         
     except Exception as e:
-        print(f"[VERIFY] Error: {e}")
+        logger.exception("[VERIFY] Verification failed")
         return True, []  # Assume OK if verification fails
 
 
-def build_generation_prompt(gen_req, has_master=False, has_cached_bg=False):
-    """Build the unified generation prompt."""
-    
-    sections = []
-    
-    # Image role assignments
+def canonicalize_section(text):
+    """Normalize whitespace in a prompt section.
+
+    Prompt caches (implicit and explicit) match on exact byte prefixes,
+    so stray trailing spaces or blank lines from edited Supabase prompts
+    would silently break cache hits.
+    """
+    return "\n".join(line.rstrip() for line in text.strip().splitlines())
+
+
+@lru_cache(maxsize=64)
+def static_prompt_prefix(orientation, lighting_prompt, has_cached_bg):
+    """Assemble and canonicalize the static sections once per
+    (orientation, lighting, background-mode) variant - at most a few
+    dozen combinations ever exist."""
+    sections = [get_composition_prompt(orientation)]
+
+    if lighting_prompt:
+        lighting = lighting_prompt
+        if has_cached_bg:
+            lighting += " Apply to both product and background - unified shadows and color temperature."
+        sections.append(lighting)
+
+    # Output quality (include aspect ratio since we can't set via API)
+    quality_instruction = get_prompt('output_quality')
+    quality_instruction += " Square 1:1 aspect ratio."
+    sections.append(quality_instruction)
+
+    return "\n\n".join(canonicalize_section(s) for s in sections)
+
+
+@lru_cache(maxsize=8)
+def image_roles_prefix(has_master, has_cached_bg):
+    """Fixed part of the image-role assignments for a flag combination.
+
+    Returns (text, next_index) so callers append detail roles starting
+    from the right image number.
+    """
     roles = ["REFERENCE IMAGES:"]
     img_idx = 1
-    
+
     if has_master:
         roles.append(f"Image {img_idx} = STYLE REFERENCE. Match this photographic style.")
         img_idx += 1
-    
+
     if has_cached_bg:
         roles.append(f"Image {img_idx} = BACKGROUND. Keep exactly as shown including all markings.")
         img_idx += 1
-    
+
     roles.append(f"Image {img_idx} = PRODUCT. Reproduce exactly with complete fidelity.")
     img_idx += 1
-    
+
+    return " ".join(roles), img_idx
+
+
+def build_generation_prompt(gen_req, has_master=False, has_cached_bg=False):
+    """Build the unified generation prompt.
+
+    Returns (static_prefix, dynamic_tail). The prefix depends only on
+    orientation, lighting scheme and background mode, so it can be
+    registered once with Gemini's explicit context cache; the tail
+    carries the per-request values.
+    """
+
+    static_prefix = static_prompt_prefix(
+        gen_req.orientation, gen_req.lighting_prompt, has_cached_bg)
+
+    # Dynamic sections - per-request image roles and values
+    sections = []
+
+    # Image role assignments
+    roles_text, img_idx = image_roles_prefix(has_master, has_cached_bg)
+    roles = [roles_text]
+
     for i, label in enumerate(gen_req.detail_labels):
         roles.append(f"Image {img_idx} = DETAIL: {label}")
         img_idx += 1
-    
+
     sections.append(" ".join(roles))
     
     # Master style
     if has_master and gen_req.master_style:
         sections.append(f"MATCH STYLE: {gen_req.master_style}")
-    
-    # Composition
-    sections.append(get_composition_prompt(gen_req.orientation))
-    
+
     # Background (if not using cached image)
     if not has_cached_bg and gen_req.background_description:
         bg_section = f"BACKGROUND: {gen_req.background_description}"
@@ -504,23 +1629,92 @@ def build_generation_prompt(gen_req, has_master=False, has_cached_bg=False):
             scale_section += f" Background: {gen_req.material_scale}."
         sections.append(scale_section)
     
-    # Lighting
-    if gen_req.lighting_prompt:
-        lighting = gen_req.lighting_prompt
-        if has_cached_bg:
-            lighting += " Apply to both product and background - unified shadows and color temperature."
-        sections.append(lighting)
-    
     # Text preservation
     if gen_req.visible_text:
         sections.append(f"PRESERVE TEXT: {gen_req.visible_text}")
-    
-    # Output quality (include aspect ratio since we can't set via API)
-    quality_instruction = get_prompt('output_quality')
-    quality_instruction += " Square 1:1 aspect ratio."
-    sections.append(quality_instruction)
-    
-    return "\n\n".join(sections)
+
+    dynamic_tail = "\n\n".join(canonicalize_section(s) for s in sections)
+    return static_prefix, dynamic_tail
+
+
+# Job results live in Redis so any worker can serve the poll; the local
+# dict covers single-worker deployments without Redis only. Entries
+# carry an expiry mirroring Redis's TTL so jobs whose clients never
+# poll don't pin their base64 payloads in the worker forever.
+_local_jobs = {}
+_local_jobs_lock = threading.Lock()
+
+
+def _store_local_job(job_id, payload):
+    now = time.time()
+    with _local_jobs_lock:
+        for stale in [k for k, (_, expiry) in _local_jobs.items() if expiry < now]:
+            _local_jobs.pop(stale, None)
+        _local_jobs[job_id] = (payload, now + JOB_TTL_SECONDS)
+
+
+def _load_local_job(job_id):
+    entry = _local_jobs.get(job_id)
+    if entry is None or entry[1] < time.time():
+        return None
+    return entry[0]
+
+
+def submit_job(fn, *args):
+    """Run a generation off the request thread; callers poll /jobs/<id>."""
+    job_id = uuid.uuid4().hex
+
+    def store(payload):
+        if redis_cache:
+            redis_cache.set_json(f"job:{job_id}", payload, JOB_TTL_SECONDS)
+        else:
+            _store_local_job(job_id, payload)
+
+    def run():
+        try:
+            response, status = fn(*args)
+            payload = {
+                "state": "done" if status == 200 else "error",
+                "response": response,
+                "status": status
+            }
+        except Exception as e:
+            logger.exception("[JOBS] %s failed", job_id)
+            payload = {"state": "error", "response": {"error": str(e)}, "status": 500}
+        store(payload)
+
+    store({"state": "pending"})
+    job_pool.submit(run)
+    return job_id
+
+
+def image_response(gen_req, image_bytes, image_b64=None, issues=None, cached=False):
+    """Build a success response in the caller's requested format.
+
+    Binary mode streams the PNG bytes directly with metadata in headers;
+    JSON mode keeps the legacy base64 envelope.
+    """
+    if gen_req.binary_response:
+        headers = {}
+        if issues:
+            headers["X-Warnings"] = json.dumps(issues)
+        if cached:
+            headers["X-Cached"] = "true"
+        return Response(image_bytes, mimetype='image/png', headers=headers), 200
+
+    if image_b64 is None:
+        image_b64 = pybase64.b64encode(image_bytes)
+
+    response = {
+        "message": "Success" if not issues else "Generated with potential issues",
+        # base64 is pure ASCII; the ascii codec skips UTF-8 validation
+        "image": image_b64.decode('ascii')
+    }
+    if issues:
+        response["warnings"] = issues
+    if cached:
+        response["cached"] = True
+    return response, 200
 
 
 def unified_generate(gen_req):
@@ -536,56 +1730,99 @@ def unified_generate(gen_req):
     
     if not gen_req.main_image:
         return {"error": "No product image provided"}, 400
-    
+
+    # Single-flight: collapse concurrent identical generations into one
+    # pipeline run. Whoever takes the lock generates; everyone else
+    # waits on the shared result key.
+    req_hash = generation_fingerprint(gen_req)
+    result_key = f"result:{req_hash}"
+    lock_key = f"lock:{req_hash}"
+    holds_lock = False
+    if redis_cache:
+        # Exact-match repeat: serve the finished result without touching
+        # Gemini at all
+        cached_result = redis_cache.get_binary(result_key)
+        if cached_result:
+            logger.info("[CACHE] Result hit: %s", req_hash)
+            return image_response(gen_req, cached_result, cached=True)
+
+        holds_lock = redis_cache.acquire_lock(lock_key, ttl=60)
+        if not holds_lock:
+            logger.info("[DEDUP] Identical request in flight: %s", req_hash)
+            duplicate = wait_for_duplicate_result(result_key)
+            if duplicate:
+                return image_response(gen_req, duplicate)
+            # Lock holder died or timed out - generate it ourselves
+
     # Determine generation mode
     needs_background_gen = gen_req.background_image is not None and gen_req.has_branding
     has_cached_bg = gen_req.cached_background is not None
     has_master = gen_req.master_image is not None
     
-    # Try to get cached background from Redis
+    # Fire independent round-trips concurrently: the Redis background
+    # lookup and the prompt fetches needed later are unrelated, so
+    # overlapping them saves a full RTT on the hot path.
+    cache_future = None
     if needs_background_gen and not has_cached_bg and redis_cache:
-        cache_key = generate_cache_key(gen_req.background_image, "bg_")
-        cached = redis_cache.get_binary(cache_key)
+        # Hash was computed while streaming the upload - no re-hash here
+        cache_key = f"bg_{gen_req.background_hash}"
+        cache_future = io_pool.submit(redis_cache.get_binary, cache_key)
+
+    # Batch-prefetch every prompt this request will need in one MGET
+    # while the Redis background lookup is in flight
+    composition_name = {
+        'flat_lay': 'composition_flat_lay',
+        'standing': 'composition_standing'
+    }.get(gen_req.orientation, 'composition_angled')
+    prompt_names = [composition_name, 'output_quality', 'verification']
+    if needs_background_gen and not has_cached_bg:
+        prompt_names.append('background_reproduction')
+    prefetch_future = io_pool.submit(prefetch_prompts, tuple(prompt_names))
+
+    if cache_future:
+        cached = cache_future.result()
         if cached:
             gen_req.cached_background = cached
             has_cached_bg = True
-            print(f"[CACHE] Background hit: {cache_key[:20]}...")
+            logger.info("[CACHE] Background hit: %s...", cache_key[:20])
+
+    prefetch_future.result()
     
     # Stage 1: Generate background if needed
     stage1_image = None
     if needs_background_gen and not has_cached_bg:
-        print("[GEN] Stage 1: Background generation")
+        logger.info("[GEN] Stage 1: Background generation")
         
         bg_prompt = get_prompt('background_reproduction')
         bg_parts = [
             types.Part.from_bytes(data=gen_req.background_image, mime_type=gen_req.background_mime),
-            bg_prompt
+            text_part(bg_prompt)
         ]
         
         stage1_image, error = generate_image(bg_parts, gen_req.quality)
         
         if error:
-            print(f"[GEN] Stage 1 failed: {error}")
+            logger.warning("[GEN] Stage 1 failed: %s", error)
             # Fall back to V1 (text-only background)
             needs_background_gen = False
         else:
             # Cache the generated background
             if redis_cache:
-                cache_key = generate_cache_key(gen_req.background_image, "bg_")
+                cache_key = f"bg_{gen_req.background_hash}"
                 redis_cache.set_binary(cache_key, stage1_image)
-                print(f"[CACHE] Background stored: {cache_key[:20]}...")
+                logger.info("[CACHE] Background stored: %s...", cache_key[:20])
             
             gen_req.cached_background = stage1_image
             has_cached_bg = True
     
     # Stage 2 (or only stage): Generate final image
-    print("[GEN] Final generation")
+    logger.info("[GEN] Final generation")
     
     # Build content parts
     content_parts = []
     
     if has_master:
-        content_parts.append(types.Part.from_bytes(data=gen_req.master_image, mime_type="image/jpeg"))
+        content_parts.append(types.Part.from_bytes(data=gen_req.master_image, mime_type=gen_req.master_mime))
     
     if has_cached_bg:
         content_parts.append(types.Part.from_bytes(data=gen_req.cached_background, mime_type="image/png"))
@@ -595,42 +1832,87 @@ def unified_generate(gen_req):
     for detail_bytes, detail_mime in gen_req.detail_images:
         content_parts.append(types.Part.from_bytes(data=detail_bytes, mime_type=detail_mime))
     
-    prompt = build_generation_prompt(gen_req, has_master, has_cached_bg)
+    static_prefix, dynamic_tail = build_generation_prompt(gen_req, has_master, has_cached_bg)
+
+    # Register the static prefix with Gemini's context cache so only the
+    # dynamic tail + images are sent per request
+    ctx_key = f"{gen_req.orientation}:{gen_req.lighting_scheme_id}:{int(has_cached_bg)}"
+    cache_name = get_context_cache(ctx_key, [static_prefix])
+
+    if cache_name:
+        prompt = dynamic_tail
+    else:
+        prompt = static_prefix + "\n\n" + dynamic_tail
     content_parts.append(prompt)
     
     # Generate with verification loop
     final_image = None
+    final_image_b64 = None
     issues = []
     verification_attempts = 0
-    
+
     for verify_attempt in range(MAX_VERIFICATION_RETRIES + 1):
         verification_attempts += 1
-        
-        generated, error = generate_image(content_parts, gen_req.quality)
-        
+
+        generated, error = generate_image_hedged(
+            content_parts, gen_req.quality, cached_content=cache_name,
+            speculative=gen_req.speculative, inline_prefix=static_prefix
+        )
+
         if error:
+            if holds_lock:
+                redis_cache.delete(lock_key)
             return {"error": error}, 500
-        
-        # Verify
-        passed, issues = verify_generation(
+
+        # Combos that pass verification >95% of the time skip the call
+        # entirely most of the time - it's an extra 1-2s for a verdict
+        # we already know
+        if should_skip_verification(gen_req.lighting_scheme_id, gen_req.orientation, has_text=bool(gen_req.visible_text)):
+            logger.info("[VERIFY] Skipped - high historical pass rate for this combo")
+            final_image = generated
+            issues = []
+            break
+
+        # Overlap verification with base64-encoding the candidate image.
+        # Verification passes in the common case, so the encode the
+        # response needs is usually finished by the time it resolves.
+        verify_future = io_pool.submit(
+            verify_generation,
             gen_req.main_image,
             generated,
             gen_req.orientation,
-            gen_req.visible_text if gen_req.visible_text else None
+            gen_req.visible_text if gen_req.visible_text else None,
+            gen_req.main_mime
         )
-        
+        encode_future = None
+        if not gen_req.binary_response:
+            encode_future = io_pool.submit(pybase64.b64encode, generated)
+        passed, issues = verify_future.result()
+        io_pool.submit(record_verification_stats, gen_req.lighting_scheme_id, gen_req.orientation, passed)
+
         if passed:
             final_image = generated
+            final_image_b64 = encode_future.result() if encode_future else None
             break
-        
+
         if verify_attempt < MAX_VERIFICATION_RETRIES:
-            print(f"[VERIFY] Failed, retrying: {issues}")
+            logger.info("[VERIFY] Failed, retrying: %s", issues)
             # Update prompt with issues
             content_parts[-1] = prompt + f"\n\nFIX THESE ISSUES: {', '.join(issues)}"
         else:
             # Return with warnings
             final_image = generated
+            final_image_b64 = encode_future.result() if encode_future else None
     
+    # Publish the result for any waiting duplicates and release the
+    # lock. Only verified images are published: replaying a known-
+    # defective image as a clean cache hit for a day is worse than
+    # letting waiters and repeats regenerate.
+    if holds_lock:
+        if not issues:
+            redis_cache.set_binary(result_key, final_image, RESULT_CACHE_TTL_SECONDS)
+        redis_cache.delete(lock_key)
+
     # Log generation
     elapsed_ms = int((time.time() - start_time) * 1000)
     log_generation({
@@ -645,15 +1927,7 @@ def unified_generate(gen_req):
         "generation_time_ms": elapsed_ms
     })
     
-    response = {
-        "message": "Success" if not issues else "Generated with potential issues",
-        "image": base64.b64encode(final_image).decode('utf-8')
-    }
-    
-    if issues:
-        response["warnings"] = issues
-    
-    return response, 200
+    return image_response(gen_req, final_image, final_image_b64, issues)
 
 
 # =============================================
@@ -689,8 +1963,9 @@ def preview_prompt():
     has_master = gen_req.master_image is not None
     has_cached_bg = gen_req.cached_background is not None
     
-    prompt = build_generation_prompt(gen_req, has_master, has_cached_bg)
-    
+    static_prefix, dynamic_tail = build_generation_prompt(gen_req, has_master, has_cached_bg)
+    prompt = static_prefix + "\n\n" + dynamic_tail
+
     return jsonify({
         "prompt": prompt,
         "prompt_length": len(prompt),
@@ -734,6 +2009,82 @@ def test_lighting_schemes():
 
 # MARK: - Analysis Endpoints
 
+def run_product_analysis(image_bytes, mime_type):
+    """Cached product-metadata analysis for one image."""
+    prompt = get_prompt('analysis_metadata')
+
+    def compute():
+        response = analysis_image_call(image_bytes, mime_type, prompt, CFG_IMAGE_METADATA, schema=SCHEMA_IMAGE_METADATA)
+        result = orjson.loads(clean_json_text(response.text))
+        return {
+            "orientation": result.get("orientation", "angled"),
+            "camera_angle": result.get("camera_angle", "3/4 view"),
+            "product_dimensions": result.get("product_dimensions", ""),
+            "visible_text": result.get("visible_text", ""),
+            "description": ""  # Backwards compatibility
+        }
+
+    return cached_analysis("img_meta_", image_bytes, prompt, compute)
+
+
+def run_detail_analysis(image_bytes, mime_type, prompt=None):
+    """Cached short-label analysis for one detail image."""
+    prompt = prompt or PROMPT_DETAIL_DEFAULT
+
+    def compute():
+        response = gemini_generate(
+            model=ANALYSIS_MODEL,
+            contents=[types.Part.from_bytes(data=image_bytes, mime_type=mime_type), prompt]
+        )
+        label = response.text.strip().strip('"\'').rstrip('.')
+        return {"label": label}
+
+    return cached_analysis("detail_", image_bytes, prompt, compute)
+
+
+def run_background_analysis(image_bytes, mime_type):
+    """Cached background/surface analysis for one image."""
+    prompt = PROMPT_BACKGROUND_ANALYSIS
+
+    def compute():
+        response = gemini_generate(
+            model=ANALYSIS_MODEL,
+            contents=[types.Part.from_bytes(data=image_bytes, mime_type=mime_type), prompt],
+            config=CFG_BACKGROUND_ANALYSIS
+        )
+        result = orjson.loads(clean_json_text(response.text))
+
+        name = result.get("name", "Custom Background")
+        words = name.split()
+        if len(words) > 4:
+            name = ' '.join(words[:4])
+
+        return {
+            "name": name,
+            "description": result.get("description", name),
+            "has_branding": result.get("has_branding", False),
+            "material_scale": result.get("material_scale", "")
+        }
+
+    return cached_analysis("bg_meta_", image_bytes, prompt, compute)
+
+
+def run_style_analysis(image_bytes, mime_type):
+    """Cached style analysis for one image."""
+    prompt = PROMPT_STYLE_ANALYSIS
+
+    def compute():
+        response = gemini_generate(
+            model=ANALYSIS_MODEL,
+            contents=[types.Part.from_bytes(data=image_bytes, mime_type=mime_type), prompt],
+            config=CFG_STYLE_ANALYSIS
+        )
+        result = orjson.loads(clean_json_text(response.text))
+        return {"style_description": result.get("style_description", "")}
+
+    return cached_analysis("style_", image_bytes, prompt, compute)
+
+
 @app.route('/analyze-image', methods=['POST'])
 def analyze_image():
     """Extract metadata from product image."""
@@ -741,28 +2092,20 @@ def analyze_image():
         return jsonify({"error": "No image file provided"}), 400
     
     file = request.files['image']
-    prompt = get_prompt('analysis_metadata')
     
     try:
-        image_bytes = file.read()
-        response = gemini_client.models.generate_content(
-            model=ANALYSIS_MODEL,
-            contents=[types.Part.from_bytes(data=image_bytes, mime_type=file.content_type), prompt],
-            config=types.GenerateContentConfig(response_mime_type="application/json")
-        )
-        
-        result = json.loads(clean_json_text(response.text))
-        
-        return jsonify({
-            "orientation": result.get("orientation", "angled"),
-            "camera_angle": result.get("camera_angle", "3/4 view"),
-            "product_dimensions": result.get("product_dimensions", ""),
-            "visible_text": result.get("visible_text", ""),
-            "description": ""  # Backwards compatibility
-        })
-        
+        image_bytes = read_upload(file)
+        mime_type = file.content_type
+        if request.form.get('hi_res', 'false').lower() != 'true':
+            image_bytes, shrunk_mime = shrink_image(image_bytes)
+            mime_type = shrunk_mime or mime_type
+
+        return jsonify(run_product_analysis(image_bytes, mime_type))
+
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"[ERROR] Analysis: {e}")
+        logger.exception("Analysis failed")
         return jsonify({"error": str(e)}), 500
 
 
@@ -775,20 +2118,21 @@ def analyze_detail():
     file = request.files['image']
     custom_prompt = request.form.get('prompt', '')
     
-    prompt = custom_prompt or "What specific detail, texture, or feature does this show? Describe in 5-10 words. Include any visible text. Write only the label."
+    prompt = custom_prompt or PROMPT_DETAIL_DEFAULT
     
     try:
-        image_bytes = file.read()
-        response = gemini_client.models.generate_content(
-            model=ANALYSIS_MODEL,
-            contents=[types.Part.from_bytes(data=image_bytes, mime_type=file.content_type), prompt]
-        )
-        
-        label = response.text.strip().strip('"\'').rstrip('.')
-        return jsonify({"label": label})
-        
+        image_bytes = read_upload(file)
+        mime_type = file.content_type
+        if request.form.get('hi_res', 'false').lower() != 'true':
+            image_bytes, shrunk_mime = shrink_image(image_bytes)
+            mime_type = shrunk_mime or mime_type
+
+        return jsonify(run_detail_analysis(image_bytes, mime_type, prompt))
+
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"[ERROR] Detail analysis: {e}")
+        logger.exception("Detail analysis failed")
         return jsonify({"error": str(e)}), 500
 
 
@@ -799,40 +2143,20 @@ def analyze_background():
         return jsonify({"error": "No image file provided"}), 400
     
     file = request.files['image']
-    
-    prompt = """Analyze this background/surface for product photography.
 
-NAME: Short name, 2-4 words
-DESCRIPTION: Describe materials, colors, textures, patterns (80-120 words). Include any text exactly.
-HAS_BRANDING: Contains text, logos, graphics to preserve? (true/false)
-MATERIAL_SCALE: Physical size of repeating elements
-
-JSON: {"name": "...", "description": "...", "has_branding": bool, "material_scale": "..."}"""
-    
     try:
-        image_bytes = file.read()
-        response = gemini_client.models.generate_content(
-            model=ANALYSIS_MODEL,
-            contents=[types.Part.from_bytes(data=image_bytes, mime_type=file.content_type), prompt],
-            config=types.GenerateContentConfig(response_mime_type="application/json")
-        )
-        
-        result = json.loads(clean_json_text(response.text))
-        
-        name = result.get("name", "Custom Background")
-        words = name.split()
-        if len(words) > 4:
-            name = ' '.join(words[:4])
-        
-        return jsonify({
-            "name": name,
-            "description": result.get("description", name),
-            "has_branding": result.get("has_branding", False),
-            "material_scale": result.get("material_scale", "")
-        })
-        
+        image_bytes = read_upload(file)
+        mime_type = file.content_type
+        if request.form.get('hi_res', 'false').lower() != 'true':
+            image_bytes, shrunk_mime = shrink_image(image_bytes)
+            mime_type = shrunk_mime or mime_type
+
+        return jsonify(run_background_analysis(image_bytes, mime_type))
+
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"[ERROR] Background analysis: {e}")
+        logger.exception("Background analysis failed")
         return jsonify({"error": str(e)}), 500
 
 
@@ -843,97 +2167,504 @@ def analyze_style():
         return jsonify({"error": "No image file provided"}), 400
     
     file = request.files['image']
-    
-    prompt = """Analyze this studio photograph for style characteristics.
-Describe in 30-50 words: lighting quality, color temperature, mood, background treatment.
-JSON: {"style_description": "..."}"""
-    
+
     try:
-        image_bytes = file.read()
-        response = gemini_client.models.generate_content(
-            model=ANALYSIS_MODEL,
-            contents=[types.Part.from_bytes(data=image_bytes, mime_type=file.content_type), prompt],
-            config=types.GenerateContentConfig(response_mime_type="application/json")
-        )
-        
-        result = json.loads(clean_json_text(response.text))
-        return jsonify({"style_description": result.get("style_description", "")})
-        
+        image_bytes = read_upload(file)
+        mime_type = file.content_type
+        if request.form.get('hi_res', 'false').lower() != 'true':
+            image_bytes, shrunk_mime = shrink_image(image_bytes)
+            mime_type = shrunk_mime or mime_type
+
+        return jsonify(run_style_analysis(image_bytes, mime_type))
+
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"[ERROR] Style analysis: {e}")
+        logger.exception("Style analysis failed")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/analyze-combined', methods=['POST'])
+def analyze_combined():
+    """Metadata, style and optional background analysis in one Gemini call.
+
+    Collapses the client's analyze-image / analyze-style /
+    analyze-background sequence into a single roundtrip.
+    """
+    if 'image' not in request.files:
+        return jsonify({"error": "No image file provided"}), 400
+
+    file = request.files['image']
+    bg_file = request.files.get('background_image')
+    prompt = PROMPT_COMBINED_ANALYSIS
+
+    try:
+        shrink = request.form.get('hi_res', 'false').lower() != 'true'
+
+        image_bytes = read_upload(file)
+        mime_type = file.content_type
+        if shrink:
+            image_bytes, shrunk_mime = shrink_image(image_bytes)
+            mime_type = shrunk_mime or mime_type
+
+        bg_bytes = b''
+        bg_mime = None
+        if bg_file:
+            bg_bytes = read_upload(bg_file)
+            bg_mime = bg_file.content_type
+            if shrink:
+                bg_bytes, shrunk_mime = shrink_image(bg_bytes)
+                bg_mime = shrunk_mime or bg_mime
+
+        def compute():
+            contents = [types.Part.from_bytes(data=image_bytes, mime_type=mime_type)]
+            if bg_bytes:
+                contents.append(types.Part.from_bytes(data=bg_bytes, mime_type=bg_mime))
+            contents.append(prompt)
+
+            response = gemini_generate(
+                model=ANALYSIS_MODEL,
+                contents=contents,
+                config=CFG_COMBINED_ANALYSIS
+            )
+            result = orjson.loads(clean_json_text(response.text))
+            return {
+                "product": result.get("product", {}),
+                "style": result.get("style", {}),
+                "background": result.get("background") if bg_bytes else None
+            }
+
+        return jsonify(cached_analysis("combined_", image_bytes + bg_bytes, prompt, compute))
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Combined analysis failed")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/analyze-bundle', methods=['POST'])
+def analyze_bundle():
+    """Full product intake - product, details, background - in one call.
+
+    A cold intake used to be up to five sequential Gemini round-trips;
+    stacking every image into one request pays network and vision
+    prefill once and returns one combined JSON.
+    """
+    if 'image' not in request.files:
+        return jsonify({"error": "No image file provided"}), 400
+
+    prompt = PROMPT_BUNDLE_ANALYSIS
+    shrink = request.form.get('hi_res', 'false').lower() != 'true'
+
+    def load(file_storage):
+        data = read_upload(file_storage)
+        mime = file_storage.content_type
+        if shrink:
+            data, shrunk_mime = shrink_image(data)
+            mime = shrunk_mime or mime
+        return data, mime
+
+    try:
+        uploads = [load(request.files['image'])]
+        labels = [None]
+
+        detail_count = 0
+        for i in range(1, 4):
+            f = request.files.get(f'detail{i}')
+            if f:
+                uploads.append(load(f))
+                labels.append("DETAIL")
+                detail_count += 1
+
+        has_background = 'background_image' in request.files
+        if has_background:
+            uploads.append(load(request.files['background_image']))
+            labels.append("BACKGROUND")
+
+        contents = []
+        for (data, mime), label in zip(uploads, labels):
+            if label:
+                contents.append(label)
+            contents.append(types.Part.from_bytes(data=data, mime_type=mime))
+        contents.append(prompt)
+
+        def compute():
+            response = gemini_generate(
+                model=ANALYSIS_MODEL,
+                contents=contents,
+                config=CFG_BUNDLE_ANALYSIS
+            )
+            result = orjson.loads(clean_json_text(response.text))
+            return {
+                "product": result.get("product", {}),
+                "details": (result.get("details") or [])[:detail_count],
+                "background": result.get("background") if has_background else None
+            }
+
+        # The role layout joins the key: the same bytes sent as a
+        # detail vs as a background are different requests and must
+        # not share a cached result
+        layout = f"d{detail_count}:bg{int(has_background)}"
+        all_bytes = b"".join(data for data, _ in uploads)
+        return jsonify(cached_analysis("bundle_", all_bytes, f"{layout}\n{prompt}", compute))
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Bundle analysis failed")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/analyze-all', methods=['POST'])
+def analyze_all():
+    """Fan out a full intake's analyses concurrently.
+
+    Unlike /analyze-bundle's single fused call, this runs the existing
+    per-image analyses in parallel on io_pool - wall time is max(call)
+    instead of sum(call), and each result lands in its own cache entry
+    so partial repeats (same product, new background) still hit.
+    """
+    if 'image' not in request.files:
+        return jsonify({"error": "No image file provided"}), 400
+
+    shrink = request.form.get('hi_res', 'false').lower() != 'true'
+
+    def load(file_storage):
+        data = read_upload(file_storage)
+        mime = file_storage.content_type
+        if shrink:
+            data, shrunk_mime = shrink_image(data)
+            mime = shrunk_mime or mime
+        return data, mime
+
+    try:
+        image_bytes, mime_type = load(request.files['image'])
+
+        futures = {
+            "product": io_pool.submit(run_product_analysis, image_bytes, mime_type),
+            "style": io_pool.submit(run_style_analysis, image_bytes, mime_type)
+        }
+
+        detail_futures = []
+        for i in range(1, 4):
+            f = request.files.get(f'detail{i}')
+            if f:
+                data, mime = load(f)
+                detail_futures.append(io_pool.submit(run_detail_analysis, data, mime))
+
+        bg_file = request.files.get('background_image')
+        if bg_file:
+            data, mime = load(bg_file)
+            futures["background"] = io_pool.submit(run_background_analysis, data, mime)
+
+        return jsonify({
+            "product": futures["product"].result(),
+            "style": futures["style"].result(),
+            "details": [f.result() for f in detail_futures],
+            "background": futures["background"].result() if bg_file else None
+        })
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Analyze-all failed")
         return jsonify({"error": str(e)}), 500
 
 
 # MARK: - Generation Endpoints (Unified)
 
+def _generation_result(response, status):
+    """Wrap unified_generate output: binary responses pass through,
+    dicts get the JSON envelope."""
+    if isinstance(response, Response):
+        return response, status
+    return jsonify(response), status
+
+
+def _run_generation(gen_req):
+    """Dispatch a parsed generation request: async callers get a job id
+    back immediately, everyone else blocks as before."""
+    if gen_req.async_job:
+        # Job payloads are stored as JSON, so force the JSON envelope
+        gen_req.binary_response = False
+        job_id = submit_job(unified_generate, gen_req)
+        return jsonify({"job_id": job_id}), 202
+    response, status = unified_generate(gen_req)
+    return _generation_result(response, status)
+
+
 @app.route('/generate-studio-image', methods=['POST'])
+@rate_limit(5)
 def generate_studio_image():
     """Generate studio image (V1 - text backgrounds)."""
-    gen_req = GenerationRequest(request)
-    response, status = unified_generate(gen_req)
-    return jsonify(response), status
+    return _run_generation(GenerationRequest(request))
 
 
 @app.route('/generate-studio-image-v2', methods=['POST'])
+@rate_limit(5)
 def generate_studio_image_v2():
     """Generate studio image (V2 - image backgrounds)."""
-    gen_req = GenerationRequest(request)
-    response, status = unified_generate(gen_req)
-    return jsonify(response), status
+    return _run_generation(GenerationRequest(request))
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Poll an async generation job."""
+    if redis_cache:
+        payload = redis_cache.get_json(f"job:{job_id}")
+    else:
+        payload = _load_local_job(job_id)
+    if payload is None:
+        return jsonify({"error": "Unknown job"}), 404
+
+    if payload.get("state") == "pending":
+        return jsonify({"state": "pending"}), 202
+
+    # Completed - the local copy is no longer needed
+    _local_jobs.pop(job_id, None)
+    body = dict(payload.get("response", {}))
+    body["state"] = payload.get("state", "done")
+    return jsonify(body), payload.get("status", 200)
+
+
+@app.route('/generate-batch', methods=['POST'])
+@rate_limit(2)
+def generate_batch():
+    """Process several generations from one multipart envelope.
+
+    The form field 'manifest' holds a JSON array of parameter dicts
+    (same fields as the single-generation endpoints); files are
+    namespaced by index, e.g. '0:image', '1:backgroundImage'. The
+    envelope is parsed once and the generations fan out in parallel.
+    """
+    manifest_raw = request.form.get('manifest', '')
+    if not manifest_raw:
+        return jsonify({"error": "No manifest provided"}), 400
+
+    try:
+        manifest = orjson.loads(manifest_raw)
+    except orjson.JSONDecodeError:
+        return jsonify({"error": "Invalid manifest JSON"}), 400
+
+    if not isinstance(manifest, list) or not manifest:
+        return jsonify({"error": "Manifest must be a non-empty array"}), 400
+    if len(manifest) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"Batch size limited to {MAX_BATCH_SIZE}"}), 400
+
+    # One parse pass over the multipart body, shared by all items
+    gen_reqs = []
+    for i, params in enumerate(manifest):
+        # Batch results are always JSON-framed
+        params.pop('format', None)
+        item_files = {
+            name.split(':', 1)[1]: f
+            for name, f in request.files.items()
+            if name.startswith(f"{i}:")
+        }
+        gen_reqs.append(GenerationRequest(BatchItem(params, item_files)))
+
+    futures = [batch_pool.submit(unified_generate, gen_req) for gen_req in gen_reqs]
+
+    results = []
+    for future in futures:
+        response, status = future.result()
+        response["status"] = status
+        results.append(response)
+
+    return jsonify({"results": results})
+
+
+def _pregenerate_one(bg_image_bytes, mime_type, quality, content_hash, want_raw=False):
+    """Generate (or fetch from cache) a single background.
+
+    Returns (payload_dict, raw_bytes) so callers can serve either the
+    JSON envelope or the raw PNG; raw_bytes is only guaranteed when
+    want_raw is set."""
+    cache_key = "bg_" + content_hash
+
+    if redis_cache:
+        # The b64 text is stored alongside the raw PNG, so JSON cache
+        # hits skip the re-encode entirely
+        cached_b64 = None if want_raw else redis_cache.get(cache_key + ':b64')
+        if cached_b64:
+            return {
+                "message": "Retrieved from cache",
+                "background_id": cache_key,
+                "image": cached_b64,
+                "cached": True
+            }, None
+
+        cached = redis_cache.get_binary(cache_key)
+        if cached:
+            payload = {
+                "message": "Retrieved from cache",
+                "background_id": cache_key,
+                "cached": True
+            }
+            # Binary responses ship the raw bytes; don't encode a JSON
+            # field they discard
+            if not want_raw:
+                payload["image"] = pybase64.b64encode(cached).decode('ascii')
+            return payload, cached
+
+    bg_prompt = get_prompt('background_reproduction')
+    bg_parts = [
+        types.Part.from_bytes(data=bg_image_bytes, mime_type=mime_type),
+        text_part(bg_prompt)
+    ]
+
+    # Coalesce a thundering herd on the same background into one
+    # generation
+    generated, error = single_flight(cache_key, lambda: generate_image(bg_parts, quality))
+
+    if error:
+        return {"error": error}, None
+
+    b64 = pybase64.b64encode(generated).decode('ascii')
+    if redis_cache:
+        redis_cache.set_binary(cache_key, generated)
+        redis_cache.set(cache_key + ':b64', b64)
+
+    return {
+        "message": "Background generated",
+        "background_id": cache_key,
+        "image": b64,
+        "cached": False
+    }, generated
+
+
+@app.route('/studio-one-shot', methods=['POST'])
+@rate_limit(5)
+def studio_one_shot():
+    """Describe and restage a product in a single multimodal call.
+
+    The separate analyze-then-generate flow uploads the image twice and
+    pays its vision prefill twice; the image-gen model is
+    multimodal-in/out, so one call returns both the description text
+    and the studio image.
+    """
+    if 'image' not in request.files:
+        return jsonify({"error": "No image file provided"}), 400
+
+    file = request.files['image']
+    binary_response = request.form.get('format', 'json') == 'binary'
+
+    try:
+        image_bytes = read_upload(file)
+        mime_type = file.content_type
+        if request.form.get('hi_res', 'false').lower() != 'true':
+            # Generation cap, not the analysis one: label text must
+            # survive for the restaged product
+            image_bytes, shrunk_mime = shrink_image(image_bytes, max_dim=GENERATION_MAX_DIMENSION)
+            mime_type = shrunk_mime or mime_type
+
+        response = gemini_generate(
+            model=IMAGE_GEN_MODEL,
+            contents=[
+                types.Part.from_bytes(data=image_bytes, mime_type=mime_type),
+                PROMPT_STUDIO_ONE_SHOT
+            ],
+            config=CFG_IMAGE_GEN
+        )
+
+        description = ""
+        generated = None
+        if response.candidates and response.candidates[0].content.parts:
+            for part in response.candidates[0].content.parts:
+                if part.text:
+                    description += part.text
+                elif part.inline_data:
+                    generated = part.inline_data.data
+
+        if not generated:
+            return jsonify({"error": "No image in response"}), 500
+
+        if binary_response:
+            return Response(generated, mimetype='image/png', headers={
+                "X-Description": description.strip().encode('ascii', 'ignore').decode('ascii')
+            })
+
+        return jsonify({
+            "description": description.strip(),
+            "image": pybase64.b64encode(generated).decode('ascii')
+        })
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Studio one-shot failed")
+        return jsonify({"error": str(e)}), 500
 
 
 @app.route('/pregenerate-background', methods=['POST'])
+@rate_limit(10)
 def pregenerate_background():
-    """Pre-generate and cache a background."""
-    if 'image' not in request.files:
+    """Pre-generate and cache one or more backgrounds."""
+    files = request.files.getlist('image')
+    if not files:
         return jsonify({"error": "No background image provided"}), 400
-    
-    file = request.files['image']
+
     quality = request.form.get('quality', '2K')
-    
+    # format=binary returns raw PNG with metadata in headers - no base64
+    # inflation and no JSON wrapping for the single-image response
+    binary_response = request.form.get('format', 'json') == 'binary'
+
     if quality not in ['1K', '2K']:
         quality = '2K'
-    
+
     try:
-        bg_image_bytes = file.read()
-        cache_key = generate_cache_key(bg_image_bytes, "bg_")
-        
-        # Check cache first
-        if redis_cache:
-            cached = redis_cache.get_binary(cache_key)
-            if cached:
-                return jsonify({
-                    "message": "Retrieved from cache",
-                    "background_id": cache_key,
-                    "image": base64.b64encode(cached).decode('utf-8'),
-                    "cached": True
-                })
-        
-        # Generate
-        bg_prompt = get_prompt('background_reproduction')
-        bg_parts = [
-            types.Part.from_bytes(data=bg_image_bytes, mime_type=file.content_type),
-            bg_prompt
-        ]
-        
-        generated, error = generate_image(bg_parts, quality)
-        
-        if error:
-            return jsonify({"error": error}), 500
-        
-        # Cache
-        if redis_cache:
-            redis_cache.set_binary(cache_key, generated)
-        
-        return jsonify({
-            "message": "Background generated",
-            "background_id": cache_key,
-            "image": base64.b64encode(generated).decode('utf-8'),
-            "cached": False
-        })
-        
+        if len(files) > 1:
+            # Each file is a paid Stage-1 generation and the rate
+            # limiter counts requests, so cap the fan-out like
+            # /generate-batch does
+            if len(files) > MAX_BATCH_SIZE:
+                return jsonify({"error": f"Batch size limited to {MAX_BATCH_SIZE}"}), 400
+            # Fan the independent generations out so wall time is
+            # max(latencies) instead of sum(latencies)
+            uploads = [read_and_hash(f) + (f.content_type,) for f in files]
+            futures = [
+                io_pool.submit(_pregenerate_one, data, mime, quality, digest)
+                for data, digest, mime in uploads
+            ]
+            results = [f.result()[0] for f in futures]
+            status = 500 if all('error' in r for r in results) else 200
+            return jsonify({"backgrounds": results}), status
+
+        file = files[0]
+        bg_image_bytes, bg_hash = read_and_hash(file)
+        etag = "bg_" + bg_hash
+
+        # The id is content-addressed, so it doubles as a strong ETag:
+        # a client that already holds it can't be stale
+        if request.headers.get('If-None-Match') == etag:
+            return Response(status=304, headers={"ETag": etag, "X-Background-Id": etag})
+
+        payload, raw = _pregenerate_one(bg_image_bytes, file.content_type, quality, bg_hash, want_raw=binary_response)
+
+        if 'error' in payload:
+            return jsonify(payload), 500
+
+        cache_headers = {
+            "ETag": etag,
+            "Cache-Control": "private, max-age=31536000, immutable"
+        }
+
+        if binary_response:
+            return Response(raw, mimetype='image/png', headers={
+                "X-Cache": "hit" if payload["cached"] else "miss",
+                "X-Background-Id": payload["background_id"],
+                **cache_headers
+            })
+
+        response = jsonify(payload)
+        response.headers.update(cache_headers)
+        return response
+
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"[ERROR] Background pre-generation: {e}")
+        logger.exception("Background pre-generation failed")
         return jsonify({"error": str(e)}), 500
 
 
@@ -953,10 +2684,21 @@ def clear_cache():
 @app.route('/cache/stats', methods=['GET'])
 def cache_stats():
     """Get cache statistics."""
-    return jsonify({
+    stats = {
         "redis_connected": redis_cache is not None,
-        "supabase_connected": supabase is not None
-    })
+        "supabase_connected": supabase is not None,
+        "l1_entries": len(_l1_cache)
+    }
+    if redis_cache:
+        hits, misses = redis_cache.mget(["stats:cache:hits", "stats:cache:misses"])
+        hits = int(hits or 0)
+        misses = int(misses or 0)
+        stats.update({
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 3) if hits + misses else None
+        })
+    return jsonify(stats)
 
 
 # MARK: - Config Endpoints
@@ -974,6 +2716,28 @@ def get_lighting_schemes():
     ]})
 
 
+@app.route('/config/reload-prompts', methods=['POST'])
+def reload_prompts():
+    """Clear prompt caches so Supabase edits take effect without a
+    restart (admin endpoint)."""
+    get_prompt.cache_clear()
+    get_lighting_scheme.cache_clear()
+    get_background_description.cache_clear()
+    static_prompt_prefix.cache_clear()
+    _prefetched_prompts.clear()
+
+    # Drop the shared Redis layer for the known names too
+    if redis_cache:
+        for name in FALLBACK_PROMPTS:
+            redis_cache.delete(f"prompt:{name}")
+        for scheme_id in FALLBACK_LIGHTING:
+            redis_cache.delete(f"lighting:{scheme_id}")
+        for bg_id in FALLBACK_BACKGROUNDS:
+            redis_cache.delete(f"background:{bg_id}")
+
+    return jsonify({"message": "Prompt caches cleared"})
+
+
 @app.route('/config/backgrounds', methods=['GET'])
 def get_backgrounds():
     """Get default backgrounds."""
@@ -1000,20 +2764,78 @@ def generate_interview_questions():
     user_prompt = request.form.get('prompt', 'Generate 3 interview questions.')
     
     try:
-        image_bytes = file.read()
-        response = gemini_client.models.generate_content(
-            model=ANALYSIS_MODEL,
-            contents=[types.Part.from_bytes(data=image_bytes, mime_type=file.content_type), user_prompt],
-            config=types.GenerateContentConfig(response_mime_type="application/json")
-        )
-        
-        questions = json.loads(clean_json_text(response.text))
-        if isinstance(questions, dict) and 'questions' in questions:
-            questions = questions['questions']
-            
-        return jsonify({"questions": questions})
-        
+        image_bytes = read_upload(file)
+        mime_type = file.content_type
+        if request.form.get('hi_res', 'false').lower() != 'true':
+            image_bytes, shrunk_mime = shrink_image(image_bytes)
+            mime_type = shrunk_mime or mime_type
+        contents = [types.Part.from_bytes(data=image_bytes, mime_type=mime_type), user_prompt]
+        config = CFG_JSON
+
+        # stream=true forwards text fragments as NDJSON the moment the
+        # model emits them, instead of buffering the whole response
+        if request.form.get('stream', 'false').lower() == 'true':
+            return Response(
+                stream_with_context(stream_ndjson(contents, config)),
+                mimetype='application/x-ndjson'
+            )
+
+        def compute():
+            response = analysis_image_call(image_bytes, mime_type, user_prompt, config)
+            questions = orjson.loads(clean_json_text(response.text))
+            if isinstance(questions, dict) and 'questions' in questions:
+                questions = questions['questions']
+            return {"questions": questions}
+
+        return jsonify(cached_analysis("interview_", image_bytes, user_prompt, compute))
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/analyze-and-question', methods=['POST'])
+def analyze_and_question():
+    """Description plus interview questions from one Gemini call.
+
+    The finished-project flow used to call /analyze-image then
+    /generate-interview-questions with the same image - two sequential
+    round-trips, each paying the image-token prefill. One call halves
+    the first-screen latency; the legacy endpoints stay for older
+    clients.
+    """
+    if 'image' not in request.files:
+        return jsonify({"error": "No image"}), 400
+
+    file = request.files['image']
+    prompt = PROMPT_ANALYZE_QUESTION
+
+    try:
+        image_bytes = read_upload(file)
+        mime_type = file.content_type
+        if request.form.get('hi_res', 'false').lower() != 'true':
+            image_bytes, shrunk_mime = shrink_image(image_bytes)
+            mime_type = shrunk_mime or mime_type
+
+        def compute():
+            response = gemini_generate(
+                model=ANALYSIS_MODEL,
+                contents=[types.Part.from_bytes(data=image_bytes, mime_type=mime_type), prompt],
+                config=CFG_ANALYZE_QUESTION
+            )
+            result = orjson.loads(clean_json_text(response.text))
+            return {
+                "description": result.get("description", ""),
+                "questions": result.get("questions", [])
+            }
+
+        return jsonify(cached_analysis("meta_q_", image_bytes, prompt, compute))
+
+    except HTTPException:
+        raise
     except Exception as e:
+        logger.exception("Analyze-and-question failed")
         return jsonify({"error": str(e)}), 500
 
 
@@ -1031,15 +2853,25 @@ def generate_captions():
 {interview_text}
 Style: {tone}, {length}.
 JSON: storytelling, expert, hybrid, hashtags."""
-        
-        response = gemini_client.models.generate_content(
-            model=ANALYSIS_MODEL,
-            contents=[prompt],
-            config=types.GenerateContentConfig(response_mime_type="application/json")
-        )
-        
-        return jsonify(json.loads(clean_json_text(response.text)))
-        
+
+        config = CFG_JSON
+
+        if data.get('stream'):
+            return Response(
+                stream_with_context(stream_ndjson([prompt], config, model=CAPTION_MODEL)),
+                mimetype='application/x-ndjson'
+            )
+
+        def compute():
+            response = gemini_generate(
+                model=CAPTION_MODEL,
+                contents=[prompt],
+                config=config
+            )
+            return orjson.loads(clean_json_text(response.text))
+
+        return jsonify(cached_text_generation("caption_", (interview_text, tone, length), compute))
+
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -1050,22 +2882,30 @@ def analyze_daily_photo():
         return jsonify({"error": "No image"}), 400
     
     file = request.files['image']
-    prompt = "Look at this WIP photo and suggest 3 prompts for social media. Casual and specific. JSON array of 3 strings."
+    prompt = PROMPT_DAILY_PHOTO
     
     try:
-        image_bytes = file.read()
-        response = gemini_client.models.generate_content(
-            model=ANALYSIS_MODEL,
-            contents=[types.Part.from_bytes(data=image_bytes, mime_type=file.content_type), prompt],
-            config=types.GenerateContentConfig(response_mime_type="application/json")
-        )
-        
-        prompts = json.loads(clean_json_text(response.text))
-        if isinstance(prompts, dict) and 'prompts' in prompts:
-            prompts = prompts['prompts']
-            
-        return jsonify({"prompts": prompts})
-        
+        image_bytes = read_upload(file)
+        mime_type = file.content_type
+        if request.form.get('hi_res', 'false').lower() != 'true':
+            image_bytes, shrunk_mime = shrink_image(image_bytes)
+            mime_type = shrunk_mime or mime_type
+
+        def compute():
+            response = gemini_generate(
+                model=ANALYSIS_MODEL,
+                contents=[types.Part.from_bytes(data=image_bytes, mime_type=mime_type), prompt],
+                config=CFG_JSON
+            )
+            prompts = orjson.loads(clean_json_text(response.text))
+            if isinstance(prompts, dict) and 'prompts' in prompts:
+                prompts = prompts['prompts']
+            return {"prompts": prompts}
+
+        return jsonify(cached_analysis("daily_", image_bytes, prompt, compute))
+
+    except HTTPException:
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -1086,15 +2926,35 @@ Casual, authentic. End with 5-10 hashtags.
 JSON: caption, hashtags."""
     
     try:
-        image_bytes = file.read()
-        response = gemini_client.models.generate_content(
-            model=ANALYSIS_MODEL,
-            contents=[types.Part.from_bytes(data=image_bytes, mime_type=file.content_type), prompt],
-            config=types.GenerateContentConfig(response_mime_type="application/json")
-        )
-        
-        return jsonify(json.loads(clean_json_text(response.text)))
-        
+        image_bytes = read_upload(file)
+        mime_type = file.content_type
+        if request.form.get('hi_res', 'false').lower() != 'true':
+            image_bytes, shrunk_mime = shrink_image(image_bytes)
+            mime_type = shrunk_mime or mime_type
+        contents = [types.Part.from_bytes(data=image_bytes, mime_type=mime_type), prompt]
+
+        # stream=true forwards text fragments as NDJSON the moment the
+        # model emits them, instead of buffering the whole response.
+        # Flash, not the Pro caption model: a 100-150 word casual
+        # update on a hot endpoint doesn't earn Pro-tier latency
+        if request.form.get('stream', 'false').lower() == 'true':
+            return Response(
+                stream_with_context(stream_ndjson(contents, CFG_JSON, model=ANALYSIS_MODEL)),
+                mimetype='application/x-ndjson'
+            )
+
+        def compute():
+            response = gemini_generate(
+                model=ANALYSIS_MODEL,
+                contents=contents,
+                config=CFG_JSON
+            )
+            return orjson.loads(clean_json_text(response.text))
+
+        return jsonify(cached_analysis("daily_cap_", image_bytes, prompt, compute))
+
+    except HTTPException:
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -0,0 +1,37 @@
+"""Gunicorn config for the Studio Lights backend.
+
+Run with:
+    gunicorn -c gunicorn_conf.py app:app
+
+Gevent workers multiplex the IO-bound Gemini/Redis/Supabase waits as
+greenlets (~KB each), so one worker services hundreds of concurrent
+uploads where a sync worker would service one. app.py monkey-patches
+at import time, before any sockets are created.
+"""
+
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '10000')}"
+
+worker_class = "gevent"
+workers = (2 * multiprocessing.cpu_count()) + 1
+worker_connections = 500
+
+# Keepalive above typical LB idle timeouts (60s) so the proxy, not us,
+# closes idle connections; generation requests can run minutes
+keepalive = 75
+timeout = 120
+
+# Initialize the Gemini client and prompt caches once in the master so
+# forked workers share them copy-on-write
+preload_app = True
+
+
+def post_fork(server, worker):
+    # Pooled TLS connections and import-time background threads don't
+    # survive the fork; re-establish both per worker
+    from app import start_log_drain, start_log_listener, warm_connections
+    start_log_listener()
+    start_log_drain()
+    warm_connections()